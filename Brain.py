@@ -45,21 +45,30 @@ STOP_WORDS = [
     "private", "limited", "ltd", "pvt", "pvt ltd",
     "marketplace", "services", "solutions", "india"
 ]
+# All stop words stripped in one scan instead of one str.replace per word
+STOP_WORDS_RE = re.compile("|".join(map(re.escape, STOP_WORDS)))
+NON_ALPHA_SPACE_RE = re.compile(r'[^a-z\s]')
+WS_RE = re.compile(r'\s+')
 
-def normalize_merchant(name):
-    name = str(name).lower()
-    name = re.sub(r'[^a-z\s]', ' ', name)
+def normalize_merchants(names):
+    """First word of each lower-cased, stop-word-free name, for a whole column at once"""
+    names = names.map(str).str.lower()
+    names = names.str.replace(NON_ALPHA_SPACE_RE, ' ', regex=True)
+    names = names.str.replace(STOP_WORDS_RE, '', regex=True)
+    names = names.str.replace(WS_RE, ' ', regex=True).str.strip()
 
-    for word in STOP_WORDS:
-        name = name.replace(word, "")
-
-    name = re.sub(r'\s+', ' ', name).strip()
-
-    return name.split()[0] if name else name
+    return names.str.split(' ', n=1).str[0]
 
 # ==========================================
 # BUILD BRAIN
 # ==========================================
+def most_common(default):
+    """Group aggregator: the modal value, computed once per group, or default"""
+    def agg(x):
+        mode = x.mode()
+        return mode.iloc[0] if not mode.empty else default
+    return agg
+
 def build_brain_df(df):
 
     desc_col = detect_column(df, ["description", "narration", "merchant", "details", "name"])
@@ -77,7 +86,7 @@ def build_brain_df(df):
     df["Category"] = df[cat_col]
     df["Sub Category"] = df[subcat_col] if subcat_col else "General"
 
-    df["merchant_key"] = df["merchant_raw"].apply(normalize_merchant)
+    df["merchant_key"] = normalize_merchants(df["merchant_raw"])
 
     st.write("📊 Before filtering:", df.shape)
 
@@ -91,8 +100,8 @@ def build_brain_df(df):
 
     grouped = df_filtered.groupby("merchant_key").agg({
         "merchant_raw": "first",
-        "Category": lambda x: x.mode()[0] if not x.mode().empty else "Other",
-        "Sub Category": lambda x: x.mode()[0] if not x.mode().empty else "General",
+        "Category": most_common("Other"),
+        "Sub Category": most_common("General"),
     }).reset_index()
 
     seen_counts = df_filtered.groupby("merchant_key").size().reset_index(name="seen")
@@ -6,7 +6,9 @@ import pandas as pd
 import numpy as np
 import plotly.express as px
 import re
+import fitz  # PyMuPDF
 import pdfplumber
+from io import BytesIO
 
 # Google Sheets
 import gspread
@@ -21,76 +23,63 @@ st.title("💳 Expense Intelligence")
 # =========================================================
 # 🔥 ULTRA ROBUST PDF PARSER (FINAL FIX)
 # =========================================================
-def extract_gpay_pdf(file):
-    records = []
-
+DATE_LINE_RE = re.compile(r"^\d{2} \w{3}, \d{4}", re.M)
+TIME_RE = re.compile(r"\d{1,2}:\d{2}")
+KIND_LINE_RE = re.compile(r"^(.*?)(Paid to|Received from|Self transfer)(.*)$", re.M)
+UPI_LINE_RE = re.compile(r"^.*UPI Transaction ID.*$", re.M)
+AMOUNT_LINE_RE = re.compile(r"^.*₹.*$", re.M)
+NON_AMOUNT_RE = re.compile(r"[^\d.]")
+TXN_TYPES = {"Paid to": "Debit", "Received from": "Credit", "Self transfer": "Self"}
+RECORD_COLUMNS = ["Date", "Time", "Description", "Type", "Amount", "UPI_ID"]
+
+def read_pdf_lines(file):
+    """Non-empty stripped text lines of the PDF (PyMuPDF, pdfplumber as fallback)"""
+    data = file.getvalue()
     try:
-        with pdfplumber.open(file) as pdf:
-            lines = []
-            for page in pdf.pages:
-                text = page.extract_text()
-                if text:
-                    lines.extend([l.strip() for l in text.split("\n") if l.strip()])
-
-        i = 0
-        while i < len(lines):
-
-            # Match date
-            if re.match(r"\d{2} \w{3}, \d{4}", lines[i]):
-
-                date = lines[i]
+        with fitz.open(stream=data, filetype="pdf") as doc:
+            text = "\n".join(page.get_text("text") for page in doc)
+    except Exception:
+        with pdfplumber.open(BytesIO(data)) as pdf:
+            text = "\n".join(page.extract_text() or "" for page in pdf.pages)
 
-                # Next line should be time
-                time = ""
-                if i+1 < len(lines) and re.search(r"\d{1,2}:\d{2}", lines[i+1]):
-                    time = lines[i+1]
+    return [l.strip() for l in text.split("\n") if l.strip()]
 
-                txn_type = "Other"
-                name = "Unknown"
-                upi_id = ""
-                amount = None
-
-                # Look ahead safely
-                for j in range(i+1, min(i+12, len(lines))):
+def extract_gpay_pdf(file):
+    records = []
 
-                    line = lines[j]
+    try:
+        lines = read_pdf_lines(file)
 
-                    if "Paid to" in line:
-                        txn_type = "Debit"
-                        name = line.replace("Paid to", "").strip()
+        # One transaction block per date line: up to the next date line, at most 11 lines of detail
+        text = "\n".join(lines)
+        starts = [m.start() for m in DATE_LINE_RE.finditer(text)] + [len(text)]
 
-                    elif "Received from" in line:
-                        txn_type = "Credit"
-                        name = line.replace("Received from", "").strip()
+        for start, end in zip(starts, starts[1:]):
+            block = text[start:end].split("\n")[:12]
+            date, detail = block[0], block[1:]
+            body = "\n".join(detail)
 
-                    elif "Self transfer" in line:
-                        txn_type = "Self"
-                        name = "Self Transfer"
+            # Next line should be time
+            time = detail[0] if detail and TIME_RE.search(detail[0]) else ""
 
-                    if "UPI Transaction ID" in line:
-                        upi_id = line.split(":")[-1].strip()
+            txn_type = "Other"
+            name = "Unknown"
+            kinds = KIND_LINE_RE.findall(body)
+            if kinds:
+                before, kind, after = kinds[-1]
+                txn_type = TXN_TYPES[kind]
+                name = "Self Transfer" if kind == "Self transfer" else (before + after).strip()
 
-                    if "₹" in line:
-                        amt = re.sub(r"[^\d.]", "", line)
-                        if amt:
-                            amount = float(amt)
+            upi_lines = UPI_LINE_RE.findall(body)
+            upi_id = upi_lines[-1].split(":")[-1].strip() if upi_lines else ""
 
-                # Only add valid rows
-                if amount is not None:
-                    records.append({
-                        "Date": date,
-                        "Time": time,
-                        "Description": name,
-                        "Type": txn_type,
-                        "Amount": amount,
-                        "UPI_ID": upi_id
-                    })
+            amounts = [a for a in (NON_AMOUNT_RE.sub("", l) for l in AMOUNT_LINE_RE.findall(body)) if a]
 
-                i += 1
-            else:
-                i += 1
+            # Only add valid rows
+            if amounts:
+                records.append((date, time, name, txn_type, float(amounts[-1]), upi_id))
 
-        df = pd.DataFrame(records)
+        df = pd.DataFrame.from_records(records, columns=RECORD_COLUMNS)
 
         if df.empty:
             st.error("❌ Still no data — PDF structure changed")
@@ -99,9 +88,13 @@ def extract_gpay_pdf(file):
         # Convert date
         df["Date"] = pd.to_datetime(df["Date"], format="%d %b, %Y", errors="coerce")
 
-        # CLEANING
-        df = df[df["Amount"] > 1]      # remove ₹0.01
-        df = df[df["Type"] != "Self"]  # remove self transfer
+        # Low-cardinality labels: int8 codes instead of repeated Python strings
+        df["Type"] = df["Type"].astype("category")
+
+        # CLEANING — one combined mask
+        keep = df["Amount"].to_numpy() > 1     # remove ₹0.01
+        keep &= (df["Type"] != "Self").to_numpy()  # remove self transfer
+        df = df[keep]
 
         st.success(f"✅ Extracted {len(df)} transactions")
 
@@ -111,6 +104,11 @@ def extract_gpay_pdf(file):
         st.error(f"❌ PDF Error: {e}")
         return pd.DataFrame()
 
+@st.cache_data(show_spinner=False)
+def load_gpay_pdf(file_bytes):
+    """Parse the statement once per upload; widget reruns reuse the cached frame"""
+    return extract_gpay_pdf(BytesIO(file_bytes))
+
 # =========================================================
 # REMOVE DUPLICATES
 # =========================================================
@@ -182,7 +180,7 @@ BRAIN_SHEET_ID = "YOUR_SHEET_ID_HERE"
 # =========================================================
 if pdf_file:
 
-    df = extract_gpay_pdf(pdf_file)
+    df = load_gpay_pdf(pdf_file.getvalue())
 
     if not df.empty:
 
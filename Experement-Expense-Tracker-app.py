@@ -966,7 +966,7 @@ with tab4:
 with tab5:
     st.markdown("### 📤 Export")
     buf = BytesIO()
-    df.sort_values(date_col).to_excel(buf, index=False)
+    df.sort_values(date_col).to_excel(buf, index=False, engine="xlsxwriter")
     st.download_button("📥 Download Excel", buf.getvalue(), "expense_data.xlsx")
 
 # =========================================================
@@ -1,22 +1,24 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import plotly.express as px
 from io import BytesIO
 import calendar
 import gdown
 from pathlib import Path
 import shutil
-import PyPDF2
-import re
-from datetime import datetime
+import requests
+from functools import lru_cache
+from urllib.parse import urlparse
+import hashlib
+import hmac
+import json
+import importlib.util
 
-# Try importing fuzzywuzzy, warn if missing
-try:
-    from fuzzywuzzy import fuzz
-except ImportError:
-    st.error("⚠️ 'fuzzywuzzy' library is missing. Please add 'fuzzywuzzy' and 'python-Levenshtein' to your requirements.txt")
-    fuzz = None
+from gpay_utils import process_pdf_data, logic_merchants, best_merchant_match, fuzz, MATCH_THRESHOLD
+
+# Warn if rapidfuzz is missing
+if fuzz is None:
+    st.error("⚠️ 'rapidfuzz' library is missing. Please add 'rapidfuzz' to your requirements.txt")
 
 # =========================================================
 # CONFIG
@@ -28,190 +30,32 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
-# =========================================================
-# PDF EXTRACTION FUNCTIONS
-# =========================================================
-def extract_gpay_transactions_from_pdf(pdf_file):
-    """
-    Extract transaction data from GPay PDF statement.
-    Handles 'Date', 'Description', 'Amount', 'Transaction ID', 'Bank', and 'Time'.
-    Explicitly IGNORES 'Self transfer' transactions.
-    """
-    
-    # Read PDF
-    pdf_reader = PyPDF2.PdfReader(pdf_file)
-    all_text = ""
-    
-    for page in pdf_reader.pages:
-        all_text += page.extract_text()
-    
-    transactions = []
-    
-    pattern = r'(\d{1,2}\s*[A-Za-z]{3},?\s*\d{4}).*?(Paid\s*to|Received\s*from|Self\s*transfer\s*to)\s+(.*?)(?:\s+UPI|\s+₹).*?₹\s*([\d,]+\.?\d*).*?UPI Transaction ID:\s*(\d+)(?:.*?Paid\s*(?:by|to)\s*(.*?))?'
-    
-    matches = re.findall(pattern, all_text, re.DOTALL | re.IGNORECASE)
-    
-    for match in matches:
-        try:
-            date_str, type_str, description_raw, amount_str, trans_id, bank_raw = match
-            
-            full_check = (type_str + " " + description_raw).lower().replace(' ', '')
-            if 'selftransfer' in full_check:
-                continue
-            
-            date_clean = re.sub(r'[^\d\w]', ' ', date_str).strip()
-            date_clean = re.sub(r'\s+', ' ', date_clean)
-            try:
-                date = datetime.strptime(date_clean, '%d %b %Y')
-            except ValueError:
-                date = datetime.strptime(date_clean, '%d %b %Y')
-            
-            amount_clean = amount_str.replace(',', '').strip()
-            amount = float(amount_clean)
-            if amount <= 0:
-                continue
-            
-            description = description_raw.strip()
-            description = description.split('UPI Transaction')[0].strip()
-            description = re.sub(r'\s+', ' ', description)
-            
-            if len(description) < 2:
-                continue
-                
-            skip_keywords = ['google pay rewards', 'googlepayrewards', 'better luck next time']
-            if any(keyword in description.lower().replace(' ', '') for keyword in skip_keywords):
-                continue
-            
-            is_received = 'received' in type_str.lower()
-            transaction_type = 'Received' if is_received else 'Sent'
-            
-            bank = bank_raw.strip() if bank_raw else "Unknown"
-            
-            transactions.append({
-                'Date': date,
-                'Description': description,
-                'Amount': amount,
-                'Type': transaction_type,
-                'Transaction ID': trans_id,
-                'Bank': bank
-            })
-            
-        except Exception as e:
-            continue
-    
-    df = pd.DataFrame(transactions)
-    
-    if not df.empty:
-        if 'Transaction ID' in df.columns:
-            df = df.drop_duplicates(subset=['Transaction ID'], keep='first')
-        else:
-            df = df.drop_duplicates(subset=['Date', 'Description', 'Amount'], keep='first')
-            
-        df = df.sort_values('Date')
-    
-    return df
-
-
-def categorize_transaction(description, amount, logic_sheet_df):
-    """Categorize transaction using smart fuzzy matching"""
-    
-    if not logic_sheet_df.empty and fuzz is not None:
-        best_match_score = 0
-        best_match_row = None
-        
-        desc_search = str(description).lower()
-        
-        for idx, row in logic_sheet_df.iterrows():
-            merchant = str(row.get('Merchant', '')).strip().lower()
-            
-            if not merchant:
-                continue
-            
-            score = fuzz.token_set_ratio(desc_search, merchant)
-            
-            if score > best_match_score:
-                best_match_score = score
-                best_match_row = row
-        
-        if best_match_score >= 70 and best_match_row is not None:
-            sub_cat = str(best_match_row.get('Subcategory', 'Yet to Name'))
-            return (
-                str(best_match_row.get('Category', 'Misc')),
-                sub_cat
-            )
-    
-    desc_lower = description.lower()
-    
-    transport_keywords = ['rapido', 'auto', 'ola', 'uber', 'metro', 'mmrda', 'railway', 'irctc', 'train', 'bus']
-    if (15 <= amount <= 50) or any(kw in desc_lower for kw in transport_keywords):
-        if any(kw in desc_lower for kw in ['metro', 'mmrda']):
-            return ('Transport', 'Metro')
-        elif any(kw in desc_lower for kw in ['railway', 'irctc', 'train']):
-            return ('Transport', 'Train')
-        else:
-            return ('Transport', 'Auto')
-    
-    return ('Misc', 'Yet to Name')
-
-
-def process_pdf_data(pdf_files, logic_sheet_df):
-    """Process multiple PDF files and categorize transactions"""
-    all_transactions = []
-    
-    for pdf_path in pdf_files:
-        try:
-            with open(pdf_path, 'rb') as f:
-                df = extract_gpay_transactions_from_pdf(f)
-                if not df.empty:
-                    all_transactions.append(df)
-        except Exception as e:
-            st.warning(f"Could not process {Path(pdf_path).name}")
-    
-    if not all_transactions:
-        return pd.DataFrame()
-    
-    combined_df = pd.concat(all_transactions, ignore_index=True)
-    
-    if 'Transaction ID' in combined_df.columns:
-        combined_df = combined_df.drop_duplicates(subset=['Transaction ID'], keep='first')
-    
-    combined_df['Category'] = 'Misc'
-    combined_df['Sub Category'] = 'Yet to Name'
-    
-    for idx, row in combined_df.iterrows():
-        if row['Type'] == 'Received':
-            combined_df.at[idx, 'Category'] = 'Income'
-            combined_df.at[idx, 'Sub Category'] = 'Received'
-        else:
-            category, subcategory = categorize_transaction(
-                row['Description'], 
-                row['Amount'], 
-                logic_sheet_df
-            )
-            combined_df.at[idx, 'Category'] = category
-            combined_df.at[idx, 'Sub Category'] = subcategory
-    
-    expense_df = combined_df[combined_df['Type'] == 'Sent'].copy()
-    expense_df = expense_df.drop('Type', axis=1)
-    
-    return expense_df
-
-
 # =========================================================
 # HELPER FUNCTIONS
 # =========================================================
-def detect(df, keys):
-    for c in df.columns:
+@lru_cache(maxsize=256)
+def detect_in_columns(columns, keys):
+    """First column whose name contains any key; memoized per (columns, keys)"""
+    for c in columns:
         for k in keys:
             if k.lower() in c.lower():
                 return c
     return None
 
 
+def detect(df, keys):
+    return detect_in_columns(tuple(df.columns), tuple(keys))
+
+
 def format_month(m):
     return pd.to_datetime(m + "-01").strftime("%B %y")
 
 
+def format_months(ms):
+    """Vectorized format_month for a Series of YYYY-MM strings"""
+    return pd.to_datetime(ms + "-01", format="%Y-%m-%d").dt.strftime("%B %y")
+
+
 def get_chart_config():
     return {
         'displayModeBar': False,
@@ -224,34 +68,201 @@ def get_chart_config():
     }
 
 
-def download_from_gdrive_folder(folder_id):
-    temp_dir = Path("temp_data")
+@st.cache_resource(ttl=600, show_spinner=False)
+def fetch_gdrive_folder(folder_id):
+    """Download a Drive folder into temp_data/<folder_id>, reused for 10 minutes (failures raise, so they are not cached)"""
+    temp_dir = Path("temp_data") / folder_id
     
+    # Only reached on a cache miss, so anything left on disk is stale
     if temp_dir.exists():
         shutil.rmtree(temp_dir)
     
-    temp_dir.mkdir(exist_ok=True)
+    temp_dir.mkdir(parents=True, exist_ok=True)
     folder_url = f"https://drive.google.com/drive/folders/{folder_id}"
     
+    gdown.download_folder(folder_url, output=str(temp_dir), quiet=False, use_cookies=False, remaining_ok=True)
+    return temp_dir
+
+
+def download_from_gdrive_folder(folder_id):
+    try:
+        return fetch_gdrive_folder(folder_id)
+    except Exception as e:
+        return None
+
+
+# Parsed files persist here across restarts, keyed by a hash of their bytes
+PARQUET_CACHE_DIR = Path.home() / ".cache" / "expense_intel"
+# Part of every cache digest: bump whenever the file readers or the PDF parser change
+PARSE_CACHE_VERSION = 1
+
+
+def parquet_cache_path(folder_id, digest):
+    return PARQUET_CACHE_DIR / folder_id / f"{digest}.parquet"
+
+
+def read_cached_parquet(path):
+    """Previously parsed frame for this hash, or None"""
+    if not path.exists():
+        return None
     try:
-        gdown.download_folder(folder_url, output=str(temp_dir), quiet=False, use_cookies=False, remaining_ok=True)
-        return temp_dir
+        return pd.read_parquet(path)
     except Exception as e:
         return None
 
 
+def write_cached_parquet(df, path, sources):
+    """Store a parsed frame plus a JSON sidecar naming its source files; caching is best-effort"""
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        df.to_parquet(path, index=False)
+        path.with_suffix(".json").write_text(json.dumps(
+            [{"file": f.name, "mtime": f.stat().st_mtime} for f in sources]
+        ))
+    except Exception as e:
+        path.unlink(missing_ok=True)
+
+
+def prune_pdf_cache(path):
+    """Drop a folder's older parsed-PDF frames (earlier logic sheets or files), keeping path"""
+    for old in path.parent.glob("pdf-*"):
+        if old.stem != path.stem:
+            old.unlink(missing_ok=True)
+
+
+def read_excel_fast(data):
+    """Read xlsx bytes with the Rust calamine engine, falling back to openpyxl when it is not installed"""
+    try:
+        return pd.read_excel(BytesIO(data), engine="calamine")
+    except ImportError:
+        return pd.read_excel(BytesIO(data))
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def load_excel_dfs(folder_id):
+    """Download and read every Excel/CSV file in a Drive folder, cached per folder for an hour"""
+    temp_dir = fetch_gdrive_folder(folder_id)
+    
+    excel_files = list(temp_dir.glob("*.xlsx")) + list(temp_dir.glob("*.csv"))
+    excel_files = [f for f in excel_files if not f.name.startswith("~$")]
+    
+    dfs = []
+    for f in excel_files:
+        try:
+            data = f.read_bytes()
+            digest = hashlib.sha1(f"v{PARSE_CACHE_VERSION}".encode())
+            digest.update(data)
+            cache_path = parquet_cache_path(folder_id, digest.hexdigest())
+            df = read_cached_parquet(cache_path)
+            if df is None:
+                if f.suffix == '.csv':
+                    df = pd.read_csv(BytesIO(data))
+                else:
+                    df = read_excel_fast(data)
+                write_cached_parquet(df, cache_path, [f])
+            dfs.append(df)
+        except Exception as e:
+            st.warning(f"Skipped: {f.name}")
+    
+    return dfs
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def load_pdf_df(folder_id, logic_sheet_hash, _logic_sheet_df):
+    """Download, parse and categorize a Drive folder of PDFs; logic_sheet_hash keys the cache on the rules in use"""
+    temp_dir = fetch_gdrive_folder(folder_id)
+    pdf_files = sorted(temp_dir.glob("*.pdf"))
+    
+    digest = hashlib.sha1(f"v{PARSE_CACHE_VERSION}:{logic_sheet_hash}".encode())
+    for f in pdf_files:
+        digest.update(f.read_bytes())
+    cache_path = parquet_cache_path(folder_id, f"pdf-{digest.hexdigest()}")
+    
+    pdf_df = read_cached_parquet(cache_path)
+    if pdf_df is None:
+        pdf_df = process_pdf_data(pdf_files, _logic_sheet_df)
+        if not pdf_df.empty:
+            write_cached_parquet(pdf_df, cache_path, pdf_files)
+            prune_pdf_cache(cache_path)
+    
+    return pdf_df, len(pdf_files)
+
+
+@st.cache_resource(ttl=3600, show_spinner=False)
+def get_master_df(folder_id, mode, logic_sheet_hash, _dfs):
+    """
+    Concatenate the loaded frames and add the typed/derived dashboard columns once.
+    Shared across reruns and sessions without copying, so callers must treat it as read-only.
+    """
+    df = pd.concat(_dfs, ignore_index=True)
+    
+    date_col = detect(df, ["date"])
+    amt_col = detect(df, ["amount"])
+    cat_col = detect(df, ["category"])
+    sub_col = detect(df, ["sub"])
+    desc_col = detect(df, ["merchant","description","name"])
+    
+    df[date_col] = pd.to_datetime(df[date_col])
+    df[amt_col] = pd.to_numeric(df[amt_col], errors="coerce").fillna(0)
+    df["Category"] = df.get(cat_col, "Uncategorized")
+    df["Sub Category"] = df.get(sub_col, "Uncategorized")
+    df["Description"] = df.get(desc_col, "Unknown")
+    df["Month"] = df[date_col].dt.strftime("%Y-%m")
+    df["Weekday"] = df[date_col].dt.day_name()
+    df["WeekType"] = np.where(df[date_col].dt.weekday >= 5, "Weekend", "Weekday")
+    
+    # Low-cardinality labels: groupby/isin work on integer codes (always group with observed=True)
+    for c in ("Category", "Sub Category", "Month", "Weekday", "WeekType"):
+        df[c] = df[c].astype("category")
+    
+    return df, date_col, amt_col
+
+
+@st.cache_resource(ttl=3600, show_spinner=False)
+def get_aggregations(folder_id, mode, logic_sheet_hash, _df, date_col, amt_col):
+    """Month-level sums the tabs chart, computed once per master frame instead of on every rerun"""
+    non_bill = _df[_df["Category"] != "Bill Payment"]
+    return {
+        "monthly": _df.groupby("Month", observed=True)[amt_col].sum(),
+        "cat_month": _df.groupby(["Month", "Category"], observed=True)[amt_col].sum(),
+        "daily": _df.groupby(["Month", date_col], observed=True)[amt_col].sum(),
+        "non_bill_cat": non_bill.groupby(["Month", "Category"], observed=True)[amt_col].sum(),
+        "non_bill_daily": non_bill.groupby(["Month", date_col], observed=True)[amt_col].sum(),
+    }
+
+
+def frame_key(df):
+    """Small content key for a DataFrame (shape, columns and row hashes)"""
+    return (len(df), tuple(df.columns), int(pd.util.hash_pandas_object(df, index=False).sum()))
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def export_files(_df, key, date_col):
+    """Date-sorted Excel (xlsxwriter) and CSV bytes of the master frame, cached on its content key"""
+    out = _df.sort_values(date_col)
+    buf = BytesIO()
+    out.to_excel(buf, index=False, engine="xlsxwriter")
+    return buf.getvalue(), out.to_csv(index=False).encode("utf-8")
+
+
+def month_slice(agg, month):
+    """One month's rows of a (Month, ...) aggregate, with the Month level dropped"""
+    if month not in agg.index.get_level_values("Month"):
+        return agg.iloc[:0].droplevel("Month")
+    return agg.xs(month, level="Month")
+
+
+@lru_cache(maxsize=512)
 def extract_folder_id_from_link(link):
     if not link or pd.isna(link):
         return None
     
     link = str(link).strip()
     
-    if '/folders/' in link:
-        try:
-            folder_id = link.split('/folders/')[1].split('?')[0].strip()
-            return folder_id
-        except:
-            return None
+    parts = [p for p in urlparse(link).path.split('/') if p]
+    if 'folders' in parts:
+        i = parts.index('folders') + 1
+        return parts[i] if i < len(parts) else None
     
     if len(link) > 20 and '/' not in link:
         return link
@@ -259,6 +270,23 @@ def extract_folder_id_from_link(link):
     return None
 
 
+# One keep-alive session for all Google Sheets CSV exports
+HTTP = requests.Session()
+
+
+def download_csv(url):
+    """Fetch a CSV export over the shared session"""
+    r = HTTP.get(url, timeout=15)
+    r.raise_for_status()
+    return pd.read_csv(BytesIO(r.content))
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def fetch_sheet_csv(url):
+    """Download a published Google Sheet as CSV, reused for 5 minutes per URL (failures raise, so they are not cached)"""
+    return download_csv(url)
+
+
 def load_logic_sheet(link):
     """Load categorization logic with SMART COLUMN DETECTION and GID support"""
     if not link or pd.isna(link):
@@ -281,7 +309,7 @@ def load_logic_sheet(link):
         
         url = f"https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=csv{gid_param}"
         
-        df = pd.read_csv(url)
+        df = fetch_sheet_csv(url)
         
         if df.empty:
             st.sidebar.warning("⚠️ Logic Sheet downloaded but is empty.")
@@ -318,21 +346,16 @@ def load_logic_sheet(link):
                 st.write("🔎 **Test Your Logic**")
                 test_txt = st.text_input("Type a merchant name...", placeholder="e.g. Swiggy")
                 if test_txt and fuzz:
-                    best_s = 0
-                    best_r = None
-                    for _, r in df.iterrows():
-                        mer = str(r['Merchant']).lower()
-                        sc = fuzz.token_set_ratio(test_txt.lower(), mer)
-                        if sc > best_s:
-                            best_s = sc
-                            best_r = r
-                    
-                    st.write(f"Best Match: **{best_r['Merchant']}**")
-                    st.write(f"Score: **{best_s}**")
-                    if best_s >= 70:
+                    match = best_merchant_match(test_txt, logic_merchants(df))
+                    if match:
+                        _, best_s, best_idx = match
+                        best_r = df.loc[best_idx]
+                        st.write(f"Best Match: **{best_r['Merchant']}**")
+                        st.write(f"Score: **{best_s:.0f}**")
+                    if match and best_s >= MATCH_THRESHOLD:
                         st.success(f"✅ Matched: {best_r['Category']}")
                     else:
-                        st.error("❌ No Match (<70)")
+                        st.error(f"❌ No Match (<{MATCH_THRESHOLD})")
             else:
                 st.error("❌ Missing Columns")
                 st.write(f"Found: {list(df.columns)}")
@@ -363,17 +386,19 @@ def generate_insights(current_month_df, previous_month_df, amt_col):
         else:
             insights.append(f"📊 Your spending is stable at ₹{current_total:,.0f}, similar to last month (₹{prev_total:,.0f})")
     
-    current_cat = current_month_df.groupby("Category")[amt_col].sum()
-    prev_cat = previous_month_df.groupby("Category")[amt_col].sum() if not previous_month_df.empty else pd.Series()
+    current_cat = current_month_df.groupby("Category", observed=True)[amt_col].sum()
+    prev_cat = previous_month_df.groupby("Category", observed=True)[amt_col].sum() if not previous_month_df.empty else pd.Series(dtype=float)
+    prev_cat = prev_cat.reindex(current_cat.index, fill_value=0)
     
-    for cat in current_cat.index:
-        if cat in prev_cat.index and prev_cat[cat] > 0:
-            cat_change = ((current_cat[cat] - prev_cat[cat]) / prev_cat[cat]) * 100
-            if cat_change > 25:
-                insights.append(f"⚠️ {cat} spending jumped by {cat_change:.1f}% (₹{current_cat[cat]:,.0f} vs ₹{prev_cat[cat]:,.0f})")
+    has_prev = prev_cat > 0
+    cat_change = (current_cat[has_prev] - prev_cat[has_prev]) / prev_cat[has_prev] * 100
+    for cat in cat_change.index[cat_change > 25]:
+        insights.append(f"⚠️ {cat} spending jumped by {cat_change[cat]:.1f}% (₹{current_cat[cat]:,.0f} vs ₹{prev_cat[cat]:,.0f})")
     
-    weekend_avg = current_month_df[current_month_df["WeekType"] == "Weekend"].groupby(current_month_df[detect(current_month_df, ["date"])])[amt_col].sum().mean()
-    weekday_avg = current_month_df[current_month_df["WeekType"] == "Weekday"].groupby(current_month_df[detect(current_month_df, ["date"])])[amt_col].sum().mean()
+    date_col = detect(current_month_df, ["date"])
+    daily_avg = current_month_df.groupby(["WeekType", date_col], observed=True)[amt_col].sum().groupby(level=0, observed=True).mean()
+    weekend_avg = daily_avg.get("Weekend", np.nan)
+    weekday_avg = daily_avg.get("Weekday", np.nan)
     
     if weekend_avg > weekday_avg * 1.3:
         insights.append(f"🎉 You spend {((weekend_avg/weekday_avg - 1) * 100):.0f}% more on weekends (₹{weekend_avg:,.0f} vs ₹{weekday_avg:,.0f} per day)")
@@ -390,26 +415,42 @@ WEEK_ORDER = ["Monday","Tuesday","Wednesday","Thursday","Friday","Saturday","Sun
 # =========================================================
 # AUTHENTICATION FUNCTIONS
 # =========================================================
-def load_credentials():
-    """Load credentials from Google Sheets"""
-    sheet_id = "1Im3g5NNm5962SUA-rd4WBr09n0nX2pLH5yHWc5BlXVA"
-    url = f"https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=csv"
-    try:
-        df = pd.read_csv(url)
-        return df
-    except Exception as e:
-        st.error(f"Error loading credentials: {e}")
+CREDENTIALS_URL = "https://docs.google.com/spreadsheets/d/1Im3g5NNm5962SUA-rd4WBr09n0nX2pLH5yHWc5BlXVA/export?format=csv"
+
+# Only the SHA-256 of the admin password is kept in source
+ADMIN_PASSWORD_SHA256 = "7676aaafb027c825bd9abab78b234070e702752f625b752e55e55b48e607e358"
+
+
+@st.cache_resource(ttl=300, show_spinner=False)
+def credential_index():
+    """Credentials rows keyed by stripped user name (first row wins); rebuilt every 5 minutes"""
+    credentials = fetch_sheet_csv(CREDENTIALS_URL)
+    index = {}
+    for row in credentials.dropna(subset=['User Name']).to_dict('records'):
+        index.setdefault(str(row['User Name']).strip(), row)
+    return index
+
+
+def check_admin(username, password):
+    return username.lower() == "admin" and hmac.compare_digest(
+        hashlib.sha256(password.encode()).hexdigest(), ADMIN_PASSWORD_SHA256
+    )
+
+
+def find_user(username, password):
+    """Credentials row for a username/password pair, or None; the password compare is constant-time"""
+    record = credential_index().get(username.strip())
+    if record is None:
         return None
+    if hmac.compare_digest(str(record['Password']).strip().encode(), password.strip().encode()):
+        return record
+    return None
 
 
 # =========================================================
 # ADMIN DIAGNOSTIC PANEL
 # =========================================================
-def admin_diagnostic_panel():
-    """
-    Admin panel to diagnose all data sources and see what's working
-    """
-    st.markdown("""
+ADMIN_CSS = """
     <style>
     .admin-header {
         background: linear-gradient(135deg, #ff6b6b 0%, #ee5a6f 100%);
@@ -453,7 +494,14 @@ def admin_diagnostic_panel():
         margin: 10px 0;
     }
     </style>
-    """, unsafe_allow_html=True)
+"""
+
+
+def admin_diagnostic_panel():
+    """
+    Admin panel to diagnose all data sources and see what's working
+    """
+    st.markdown(ADMIN_CSS, unsafe_allow_html=True)
     
     st.markdown("""
     <div class="admin-header">
@@ -485,7 +533,7 @@ def admin_diagnostic_panel():
             st.markdown(f"**Sheet ID:** `{sheet_id}`")
             st.markdown(f"**URL:** [{url}]({url})")
             
-            creds_df = pd.read_csv(url)
+            creds_df = download_csv(url)
             
             status_class = "status-good"
             status_icon = "✅"
@@ -543,10 +591,20 @@ def admin_diagnostic_panel():
     # =================================================================
     st.markdown("## 2️⃣ User Data Sources")
     
+    if st.button("🧹 Clear Drive Download Cache", key="clear_gdrive_cache"):
+        fetch_gdrive_folder.clear()
+        load_excel_dfs.clear()
+        load_pdf_df.clear()
+        get_master_df.clear()
+        get_aggregations.clear()
+        export_files.clear()
+        shutil.rmtree(PARQUET_CACHE_DIR, ignore_errors=True)
+        st.success("✅ Drive folders will be re-downloaded and re-parsed on next access")
+    
     try:
         sheet_id = "1Im3g5NNm5962SUA-rd4WBr09n0nX2pLH5yHWc5BlXVA"
         url = f"https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=csv"
-        creds_df = pd.read_csv(url)
+        creds_df = download_csv(url)
         
         usernames = creds_df['User Name'].dropna().tolist()
         selected_user = st.selectbox("👤 Select User to Diagnose", usernames)
@@ -583,7 +641,6 @@ def admin_diagnostic_panel():
                                     st.success(f"✅ Accessible! Found {len(files)} files")
                                     for f in files:
                                         st.write(f"- {f.name}")
-                                    shutil.rmtree(temp_dir)
                                 else:
                                     st.error("❌ Cannot access folder. Check permissions.")
                     else:
@@ -614,7 +671,6 @@ def admin_diagnostic_panel():
                                     st.success(f"✅ Accessible! Found {len(files)} PDFs")
                                     for f in files:
                                         st.write(f"- {f.name}")
-                                    shutil.rmtree(temp_dir)
                                 else:
                                     st.error("❌ Cannot access folder. Check permissions.")
                     else:
@@ -646,7 +702,7 @@ def admin_diagnostic_panel():
                         url = f"https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=csv{gid_param}"
                         st.markdown(f"**Export URL:** [{url}]({url})")
                         
-                        logic_df = pd.read_csv(url)
+                        logic_df = download_csv(url)
                         
                         st.markdown(f"""
                         <div class="status-box status-good">
@@ -676,24 +732,17 @@ def admin_diagnostic_panel():
                             test_merchant = st.text_input("Enter a merchant name to test", 
                                                          placeholder="e.g., Swiggy")
                             if test_merchant:
-                                best_score = 0
-                                best_match = None
-                                
-                                for _, row in logic_df.iterrows():
-                                    if 'Merchant' in row:
-                                        merchant = str(row['Merchant']).lower()
-                                        score = fuzz.token_set_ratio(test_merchant.lower(), merchant)
-                                        if score > best_score:
-                                            best_score = score
-                                            best_match = row
+                                match = best_merchant_match(test_merchant, logic_merchants(logic_df))
+                                best_score = match[1] if match else 0
+                                best_match = logic_df.loc[match[2]] if match else pd.Series(dtype=object)
                                 
                                 st.write(f"**Best Match:** {best_match.get('Merchant', 'N/A')}")
-                                st.write(f"**Score:** {best_score}")
+                                st.write(f"**Score:** {best_score:.0f}")
                                 
-                                if best_score >= 70:
+                                if best_score >= MATCH_THRESHOLD:
                                     st.success(f"✅ Would categorize as: {best_match.get('Category', 'N/A')}")
                                 else:
-                                    st.warning("⚠️ Score too low (<70), would fallback to heuristics")
+                                    st.warning(f"⚠️ Score too low (<{MATCH_THRESHOLD}), would fallback to heuristics")
                         
                     except Exception as e:
                         st.markdown(f"""
@@ -716,20 +765,18 @@ def admin_diagnostic_panel():
     
     with st.expander("🔧 Dependencies & Libraries", expanded=True):
         if fuzz:
-            st.success("✅ fuzzywuzzy: Installed")
+            st.success("✅ rapidfuzz: Installed")
         else:
-            st.error("❌ fuzzywuzzy: Missing - Add to requirements.txt")
+            st.error("❌ rapidfuzz: Missing - Add to requirements.txt")
         
-        libs = {
-            'pandas': pd,
-            'numpy': np,
-            'plotly': px,
-            'PyPDF2': PyPDF2,
-            'gdown': gdown
-        }
+        # Only look the libraries up; importing plotly/PyPDF2 here would undo their deferred loading
+        libs = ['pandas', 'numpy', 'plotly', 'PyPDF2', 'gdown']
         
-        for lib_name, lib_obj in libs.items():
-            st.success(f"✅ {lib_name}: Installed")
+        for lib_name in libs:
+            if importlib.util.find_spec(lib_name) is not None:
+                st.success(f"✅ {lib_name}: Installed")
+            else:
+                st.error(f"❌ {lib_name}: Missing - Add to requirements.txt")
     
     with st.expander("📊 Session State", expanded=False):
         st.markdown("**Current Session Variables:**")
@@ -743,10 +790,7 @@ def admin_diagnostic_panel():
 # =========================================================
 # LOGIN PAGE (WITH ADMIN ACCESS)
 # =========================================================
-def login_page():
-    """Beautiful login page with admin access"""
-    
-    st.markdown("""
+LOGIN_CSS = """
     <style>
     .login-container {
         max-width: 450px;
@@ -811,7 +855,13 @@ def login_page():
         font-style: italic;
     }
     </style>
-    """, unsafe_allow_html=True)
+"""
+
+
+def login_page():
+    """Beautiful login page with admin access"""
+    
+    st.markdown(LOGIN_CSS, unsafe_allow_html=True)
     
     col1, col2, col3 = st.columns([1, 2, 1])
     
@@ -820,17 +870,16 @@ def login_page():
         st.markdown('<div class="login-title">💳 Expense Intelligence</div>', unsafe_allow_html=True)
         st.markdown('<div class="login-subtitle">Designed for awareness, not anxiety</div>', unsafe_allow_html=True)
         
-        username = st.text_input("Username", placeholder="Enter your username", key="login_user")
-        password = st.text_input("Password", type="password", placeholder="Enter your password", key="login_pass")
-        
-        st.markdown('<div class="login-button">', unsafe_allow_html=True)
-        login_btn = st.button("🔐 Login", use_container_width=True)
-        st.markdown('</div>', unsafe_allow_html=True)
+        # One rerun on submit instead of one per edited field
+        with st.form(key="login_form"):
+            username = st.text_input("Username", placeholder="Enter your username", key="login_user")
+            password = st.text_input("Password", type="password", placeholder="Enter your password", key="login_pass")
+            login_btn = st.form_submit_button("🔐 Login", use_container_width=True)
         
         if login_btn:
             if username and password:
                 # Check for admin credentials (hardcoded for security)
-                if username.lower() == "admin" and password == "admin@123":
+                if check_admin(username, password):
                     st.session_state['authenticated'] = True
                     st.session_state['is_admin'] = True
                     st.session_state['username'] = "Admin"
@@ -838,18 +887,18 @@ def login_page():
                     st.rerun()
                 else:
                     # Check regular users
-                    credentials = load_credentials()
+                    try:
+                        user_match = find_user(username, password)
+                        credentials_ok = True
+                    except Exception as e:
+                        st.error(f"Error loading credentials: {e}")
+                        credentials_ok = False
                     
-                    if credentials is not None:
-                        user_match = credentials[
-                            (credentials['User Name'].str.strip() == username.strip()) & 
-                            (credentials['Password'].astype(str).str.strip() == password.strip())
-                        ]
-                        
-                        if not user_match.empty:
-                            excel_link = user_match.iloc[0].get('Excel Google Drive Data Link', '')
-                            pdf_link = user_match.iloc[0].get('PDF Google Drive Data Link', '')
-                            logic_link = user_match.iloc[0].get('Logic Sheet', '')
+                    if credentials_ok:
+                        if user_match is not None:
+                            excel_link = user_match.get('Excel Google Drive Data Link', '')
+                            pdf_link = user_match.get('PDF Google Drive Data Link', '')
+                            logic_link = user_match.get('Logic Sheet', '')
                             
                             st.session_state['authenticated'] = True
                             st.session_state['is_admin'] = False
@@ -889,7 +938,7 @@ if st.session_state.get('is_admin', False):
 # =========================================================
 # UI THEME (AFTER LOGIN - FOR REGULAR USERS)
 # =========================================================
-st.markdown("""
+THEME_CSS = """
 <style>
 body { background:#0b1220; color:#e5e7eb; }
 .section-box {
@@ -937,7 +986,10 @@ body { background:#0b1220; color:#e5e7eb; }
     line-height: 1.6;
 }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+# Streamlit drops elements a rerun does not re-emit, so the styles go out on every run
+st.markdown(THEME_CSS, unsafe_allow_html=True)
 
 
 # =========================================================
@@ -966,6 +1018,8 @@ with st.sidebar:
 # Load Logic Sheet (Smartly)
 logic_sheet_df = load_logic_sheet(st.session_state.get('logic_sheet_link', ''))
 
+logic_sheet_hash = int(pd.util.hash_pandas_object(logic_sheet_df).sum()) if not logic_sheet_df.empty else 0
+
 dfs = []
 
 if data_mode == "📊 Excel/CSV Database":
@@ -984,37 +1038,25 @@ if data_mode == "📊 Excel/CSV Database":
     
     st.sidebar.info(f"📁 Syncing Excel/CSV from Drive")
     
-    if st.sidebar.button("🔄 Sync Now") or 'excel_loaded' not in st.session_state:
-        with st.spinner("Downloading Excel/CSV files..."):
-            temp_dir = download_from_gdrive_folder(folder_id)
-            
-            if temp_dir is None:
-                st.error("⚠️ Could not access Google Drive folder")
-                st.stop()
-            
-            excel_files = list(temp_dir.glob("*.xlsx")) + list(temp_dir.glob("*.csv"))
-            excel_files = [f for f in excel_files if not f.name.startswith("~$")]
-            
-            if not excel_files:
-                st.warning("📂 No Excel/CSV files found")
-                st.stop()
-            
-            for f in excel_files:
-                try:
-                    if f.suffix == '.csv':
-                        dfs.append(pd.read_csv(f))
-                    else:
-                        dfs.append(pd.read_excel(f))
-                except Exception as e:
-                    st.warning(f"Skipped: {f.name}")
-            
-            if dfs:
-                st.session_state['excel_loaded'] = True
-                st.session_state['excel_dfs'] = dfs
-                st.sidebar.success(f"✅ Loaded {len(dfs)} files")
+    if st.sidebar.button("🔄 Sync Now"):
+        fetch_gdrive_folder.clear(folder_id)
+        load_excel_dfs.clear(folder_id)
+        get_master_df.clear()
+        get_aggregations.clear()
+        export_files.clear()
+    
+    with st.spinner("Downloading Excel/CSV files..."):
+        try:
+            dfs = load_excel_dfs(folder_id)
+        except Exception as e:
+            st.error("⚠️ Could not access Google Drive folder")
+            st.stop()
+    
+    if not dfs:
+        st.warning("📂 No Excel/CSV files found")
+        st.stop()
     
-    if 'excel_dfs' in st.session_state:
-        dfs = st.session_state['excel_dfs']
+    st.sidebar.success(f"✅ Loaded {len(dfs)} files")
 
 else:  # PDF MODE
     pdf_link = st.session_state.get('pdf_drive_link', '')
@@ -1031,70 +1073,55 @@ else:  # PDF MODE
     
     st.sidebar.info(f"📄 Syncing PDFs from Drive")
     
-    if st.sidebar.button("🔄 Sync Now") or 'pdf_loaded' not in st.session_state:
-        with st.spinner("Downloading and processing PDFs..."):
-            temp_dir = download_from_gdrive_folder(folder_id)
-            
-            if temp_dir is None:
-                st.error("⚠️ Could not access Google Drive folder")
-                st.stop()
-            
-            pdf_files = list(temp_dir.glob("*.pdf"))
-            
-            if not pdf_files:
-                st.warning("📂 No PDF files found")
-                st.stop()
-            
-            # Process all PDFs
-            pdf_df = process_pdf_data(pdf_files, logic_sheet_df)
-            
-            if pdf_df.empty:
-                st.error("❌ No transactions extracted from PDFs")
-                st.stop()
-            
-            dfs = [pdf_df]
-            st.session_state['pdf_loaded'] = True
-            st.session_state['pdf_dfs'] = dfs
-            st.sidebar.success(f"✅ Processed {len(pdf_files)} PDFs, {len(pdf_df)} transactions")
+    if st.sidebar.button("🔄 Sync Now"):
+        fetch_gdrive_folder.clear(folder_id)
+        load_pdf_df.clear()
+        get_master_df.clear()
+        get_aggregations.clear()
+        export_files.clear()
+    
+    with st.spinner("Downloading and processing PDFs..."):
+        try:
+            pdf_df, pdf_count = load_pdf_df(folder_id, logic_sheet_hash, logic_sheet_df)
+        except Exception as e:
+            st.error("⚠️ Could not access Google Drive folder")
+            st.stop()
+    
+    if pdf_count == 0:
+        st.warning("📂 No PDF files found")
+        st.stop()
+    
+    if pdf_df.empty:
+        st.error("❌ No transactions extracted from PDFs")
+        st.stop()
     
-    if 'pdf_dfs' in st.session_state:
-        dfs = st.session_state['pdf_dfs']
+    dfs = [pdf_df]
+    st.sidebar.success(f"✅ Processed {pdf_count} PDFs, {len(pdf_df)} transactions")
 
 if not dfs:
     st.info("📁 Click 'Sync Now' to load data")
     st.stop()
 
-df = pd.concat(dfs, ignore_index=True)
 
 
 # =========================================================
 # DATA PREP
 # =========================================================
-date_col = detect(df, ["date"])
-amt_col = detect(df, ["amount"])
-cat_col = detect(df, ["category"])
-sub_col = detect(df, ["sub"])
-desc_col = detect(df, ["merchant","description","name"])
-
-df[date_col] = pd.to_datetime(df[date_col])
-df[amt_col] = pd.to_numeric(df[amt_col], errors="coerce").fillna(0)
-df["Category"] = df.get(cat_col, "Uncategorized")
-df["Sub Category"] = df.get(sub_col, "Uncategorized")
-df["Description"] = df.get(desc_col, "Unknown")
-df["Month"] = df[date_col].dt.to_period("M").astype(str)
-df["Weekday"] = df[date_col].dt.day_name()
-df["WeekType"] = np.where(df[date_col].dt.weekday >= 5, "Weekend", "Weekday")
+# Read-only: shared by every rerun for this folder/mode/logic sheet
+df, date_col, amt_col = get_master_df(folder_id, data_mode, logic_sheet_hash, dfs)
+aggs = get_aggregations(folder_id, data_mode, logic_sheet_hash, df, date_col, amt_col)
 
 
 # =========================================================
 # FILTERS
 # =========================================================
-months = sorted(df["Month"].unique())
+months = sorted(df["Month"].dropna().unique())
+month_labels = dict(zip(months, format_months(pd.Series(months, dtype=str))))
 selected_month = st.sidebar.selectbox(
     "Month",
     months,
     index=len(months)-1,
-    format_func=format_month
+    format_func=month_labels.get
 )
 
 month_df = df[df["Month"] == selected_month]
@@ -1107,6 +1134,10 @@ previous_month_df = df[df["Month"] == months[current_month_idx - 1]] if current_
 # =========================================================
 # TABS
 # =========================================================
+# Charting library loads only once a user is logged in and data is ready;
+# figures are built from the cached aggregates with graph_objects (no px frame introspection)
+import plotly.graph_objects as go
+
 tab1, tab2, tab3, tab4, tab5 = st.tabs([
     "📈 Trends",
     "📅 Monthly View",
@@ -1124,17 +1155,23 @@ with tab1:
     c1, c2 = st.columns(2)
     
     with c2:
-        monthly = df.groupby("Month")[amt_col].sum().reset_index()
-        fig = px.line(monthly, x="Month", y=amt_col, markers=True,
-                template="plotly_dark", title="Total Monthly Spend")
-        fig.update_layout(xaxis_fixedrange=True, yaxis_fixedrange=True)
+        monthly = aggs["monthly"]
+        fig = go.Figure(go.Scatter(x=monthly.index.to_numpy(), y=monthly.to_numpy(), mode="lines+markers"))
+        fig.update_layout(template="plotly_dark", title="Total Monthly Spend",
+                          xaxis_title="Month", yaxis_title=amt_col,
+                          xaxis_fixedrange=True, yaxis_fixedrange=True)
         st.plotly_chart(fig, use_container_width=True, config=get_chart_config())
     
     with c1:
-        cat_trend = df.groupby(["Month","Category"])[amt_col].sum().reset_index()
-        fig = px.line(cat_trend, x="Month", y=amt_col, color="Category",
-                template="plotly_dark", title="Category-wise Trend")
-        fig.update_layout(xaxis_fixedrange=True, yaxis_fixedrange=True)
+        # One trace per category, in order of first appearance
+        fig = go.Figure([
+            go.Scatter(x=trend.index.get_level_values("Month").to_numpy(), y=trend.to_numpy(),
+                       mode="lines", name=str(cat))
+            for cat, trend in aggs["cat_month"].groupby(level="Category", observed=True, sort=False)
+        ])
+        fig.update_layout(template="plotly_dark", title="Category-wise Trend",
+                          xaxis_title="Month", yaxis_title=amt_col, legend_title="Category",
+                          xaxis_fixedrange=True, yaxis_fixedrange=True)
         st.plotly_chart(fig, use_container_width=True, config=get_chart_config())
 
 
@@ -1142,14 +1179,14 @@ with tab1:
 # TAB 2 — MONTHLY VIEW
 # =========================================================
 with tab2:
-    st.markdown(f"### 📅 {format_month(selected_month)} Overview")
+    st.markdown(f"### 📅 {month_labels[selected_month]} Overview")
     
     k1,k2,k3,k4 = st.columns(4)
     kpis = [
         (k1,"Total Spend",month_df[amt_col].sum()),
         (k2,"Excl. Bills",non_bill_df[amt_col].sum()),
-        (k3,"Daily Avg",non_bill_df.groupby(date_col)[amt_col].sum().mean()),
-        (k4,"Top Category",non_bill_df.groupby("Category")[amt_col].sum().idxmax() if not non_bill_df.empty else "N/A")
+        (k3,"Daily Avg",month_slice(aggs["non_bill_daily"], selected_month).mean()),
+        (k4,"Top Category",month_slice(aggs["non_bill_cat"], selected_month).idxmax() if not non_bill_df.empty else "N/A")
     ]
     for col,title,val in kpis:
         display = f"₹{val:,.0f}" if isinstance(val,(int,float,np.number)) else str(val)
@@ -1167,109 +1204,110 @@ with tab2:
             int(selected_month.split("-")[0]),
             int(selected_month.split("-")[1])
         )[1]
-        daily = (
-            non_bill_df.groupby(date_col)[amt_col]
-            .sum()
+        actual = (
+            month_slice(aggs["non_bill_daily"], selected_month)
             .reindex(pd.date_range(month_df[date_col].min(),
                                    month_df[date_col].max()), fill_value=0)
             .cumsum()
-            .reset_index()
         )
-        daily.columns = ["Date", "Actual"]
         ideal = np.linspace(0, budget, days)
-        fig = px.line(daily, x="Date", y="Actual", template="plotly_dark")
-        fig.add_scatter(
-            x=pd.date_range(daily["Date"].min(), periods=days),
-            y=ideal, name="Ideal"
-        )
-        fig.update_layout(xaxis_fixedrange=True, yaxis_fixedrange=True)
+        fig = go.Figure([
+            go.Scatter(x=actual.index, y=actual.to_numpy(), mode="lines", name="Actual"),
+            go.Scatter(x=pd.date_range(actual.index.min(), periods=days), y=ideal, mode="lines", name="Ideal"),
+        ])
+        fig.update_layout(template="plotly_dark", xaxis_title="Date", yaxis_title="Actual",
+                          xaxis_fixedrange=True, yaxis_fixedrange=True)
         st.plotly_chart(fig, use_container_width=True, config=get_chart_config())
 
     with right:
         st.markdown("#### 🧩 Expense Composition")
         
-        chart_df = month_df.copy()
-        total_monthly = chart_df[amt_col].sum()
-        
-        cat_sums = chart_df.groupby("Category")[amt_col].sum()
+        total_monthly = month_df[amt_col].sum()
         
-        chart_df["Category Label"] = chart_df["Category"].apply(
-            lambda x: f"{x} ({cat_sums.get(x, 0) / total_monthly:.1%})" if total_monthly > 0 else x
-        )
+        cat_sums = month_slice(aggs["cat_month"], selected_month)
+        sub_sums = month_df.groupby(["Category", "Sub Category"], observed=True)[amt_col].sum()
         
-        fig = px.treemap(
-            chart_df,
-            path=["Category Label", "Sub Category"],
-            values=amt_col,
-            template="plotly_dark"
-        )
+        # One label per category; sub category tiles hang off it by id
+        if total_monthly > 0:
+            label_map = {c: f"{c} ({v / total_monthly:.1%})" for c, v in cat_sums.items()}
+        else:
+            label_map = {c: str(c) for c in cat_sums.index}
+        sub_parents = [label_map[c] for c, _ in sub_sums.index]
+        sub_labels = [str(sub) for _, sub in sub_sums.index]
         
-        fig.update_traces(
+        fig = go.Figure(go.Treemap(
+            ids=list(label_map.values()) + [f"{p}/{l}" for p, l in zip(sub_parents, sub_labels)],
+            labels=list(label_map.values()) + sub_labels,
+            parents=[""] * len(label_map) + sub_parents,
+            values=np.concatenate([cat_sums.to_numpy(), sub_sums.to_numpy()]),
+            branchvalues="total",
             textinfo="label+value+percent root",
             texttemplate="%{label}<br>₹%{value:,.0f}<br>%{percentRoot:.1%}"
-        )
+        ))
         
-        fig.update_layout(xaxis_fixedrange=True, yaxis_fixedrange=True)
+        fig.update_layout(template="plotly_dark", xaxis_fixedrange=True, yaxis_fixedrange=True)
         st.plotly_chart(fig, use_container_width=True, config=get_chart_config())
 
     st.markdown("#### 📆 Spending Pattern")
     c1,c2 = st.columns(2)
     with c1:
-        fig = px.bar(
-            month_df.groupby("Category")[amt_col].sum().reset_index(),
-            x="Category", y=amt_col,
-            template="plotly_dark", title="Category vs Amount"
-        )
-        fig.update_layout(xaxis_fixedrange=True, yaxis_fixedrange=True)
+        fig = go.Figure(go.Bar(x=cat_sums.index.to_numpy(), y=cat_sums.to_numpy()))
+        fig.update_layout(template="plotly_dark", title="Category vs Amount",
+                          xaxis_title="Category", yaxis_title=amt_col,
+                          xaxis_fixedrange=True, yaxis_fixedrange=True)
         st.plotly_chart(fig, use_container_width=True, config=get_chart_config())
     with c2:
-        fig = px.bar(
-            month_df.groupby(date_col)[amt_col].sum().reset_index(),
-            x=date_col, y=amt_col,
-            template="plotly_dark", title="Amount vs Day"
-        )
-        fig.update_layout(xaxis_fixedrange=True, yaxis_fixedrange=True)
+        day_sums = month_slice(aggs["daily"], selected_month)
+        fig = go.Figure(go.Bar(x=day_sums.index, y=day_sums.to_numpy()))
+        fig.update_layout(template="plotly_dark", title="Amount vs Day",
+                          xaxis_title=date_col, yaxis_title=amt_col,
+                          xaxis_fixedrange=True, yaxis_fixedrange=True)
         st.plotly_chart(fig, use_container_width=True, config=get_chart_config())
 
     st.markdown("### 📅 Weekday vs Weekend Behaviour")
     f1,f2,f3 = st.columns([1.2,1.2,1])
+    # Build one combined mask over the month's arrays and materialize the filtered frame once
+    month_cats = month_df["Category"].to_numpy()
+    month_subs = month_df["Sub Category"].to_numpy()
     with f1:
         with st.popover("Filter Category"):
             selected_categories = [
-                cat for cat in sorted(month_df["Category"].unique())
+                cat for cat in sorted(pd.unique(month_cats))
                 if st.checkbox(cat, value=True, key=f"cat_{cat}")
             ]
-    filtered = month_df[month_df["Category"].isin(selected_categories)]
+    cat_mask = month_df["Category"].isin(selected_categories).to_numpy()
     with f2:
         with st.popover("Filter Sub Category"):
             selected_subcategories = [
-                sub for sub in sorted(filtered["Sub Category"].unique())
+                sub for sub in sorted(pd.unique(month_subs[cat_mask]))
                 if st.checkbox(sub, value=True, key=f"sub_{sub}")
             ]
-    filtered = filtered[filtered["Sub Category"].isin(selected_subcategories)]
+    filtered = month_df[cat_mask & month_df["Sub Category"].isin(selected_subcategories).to_numpy()]
     with f3:
         metric = st.selectbox("Metric", ["Total Spend","Average Spend (per calendar day)"])
 
     if metric == "Total Spend":
-        day_metric = filtered.groupby("Weekday")[amt_col].sum()
+        day_metric = filtered.groupby("Weekday", observed=True)[amt_col].sum()
     else:
         day_metric = (
-            filtered.groupby([date_col,"Weekday"])[amt_col].sum()
-            .reset_index().groupby("Weekday")[amt_col].mean()
+            filtered.groupby([date_col,"Weekday"], observed=True)[amt_col].sum()
+            .reset_index().groupby("Weekday", observed=True)[amt_col].mean()
         )
-    day_metric = day_metric.reindex(WEEK_ORDER).reset_index()
+    day_metric = day_metric.reindex(WEEK_ORDER)
 
     c1,c2 = st.columns([2.2,1])
     with c1:
-        fig = px.bar(day_metric, x="Weekday", y=amt_col, template="plotly_dark",
-               title=f"{metric} by Day")
-        fig.update_layout(xaxis_fixedrange=True, yaxis_fixedrange=True)
+        fig = go.Figure(go.Bar(x=WEEK_ORDER, y=day_metric.to_numpy()))
+        fig.update_layout(template="plotly_dark", title=f"{metric} by Day",
+                          xaxis_title="Weekday", yaxis_title=amt_col,
+                          xaxis_fixedrange=True, yaxis_fixedrange=True)
         st.plotly_chart(fig, use_container_width=True, config=get_chart_config())
     with c2:
-        fig = px.bar(filtered.groupby("WeekType")[amt_col].mean().reset_index(),
-               x="WeekType", y=amt_col, template="plotly_dark",
-               title="Weekday vs Weekend")
-        fig.update_layout(xaxis_fixedrange=True, yaxis_fixedrange=True)
+        week_type = filtered.groupby("WeekType", observed=True)[amt_col].mean()
+        fig = go.Figure(go.Bar(x=week_type.index.to_numpy(), y=week_type.to_numpy()))
+        fig.update_layout(template="plotly_dark", title="Weekday vs Weekend",
+                          xaxis_title="WeekType", yaxis_title=amt_col,
+                          xaxis_fixedrange=True, yaxis_fixedrange=True)
         st.plotly_chart(fig, use_container_width=True, config=get_chart_config())
 
 
@@ -1315,14 +1353,18 @@ with tab4:
 # TAB 5 — EXPORT
 # =========================================================
 with tab5:
-    buf = BytesIO()
-    df.sort_values(date_col).to_excel(buf, index=False)
-    buf.seek(0)
+    excel_bytes, csv_bytes = export_files(df, frame_key(df), date_col)
     st.download_button(
         "Download Clean Excel",
-        data=buf,
+        data=excel_bytes,
         file_name="expense_intelligence_clean.xlsx"
     )
+    st.download_button(
+        "Download CSV",
+        data=csv_bytes,
+        file_name="expense_intelligence_clean.csv",
+        mime="text/csv"
+    )
 
 st.markdown("---")
 st.markdown("<div class='subtle'>Built for thinking, not panic.</div>", unsafe_allow_html=True)
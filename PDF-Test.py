@@ -1,116 +1,124 @@
 import streamlit as st
 import pandas as pd
-import PyPDF2
+import numpy as np
 import re
-from datetime import datetime
 from io import BytesIO
 
-def extract_gpay_transactions(pdf_file):
+# pypdfium2 is the fast text extractor; PyPDF2 is the fallback, imported only when needed
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
+# =========================================================
+# REGEX PATTERNS (compiled once per process)
+# =========================================================
+# Enhanced pattern to capture all transaction variations
+# This pattern is more flexible to handle various PDF formatting issues
+TXN_RE = re.compile(
+    r'(\d{1,2}\s*(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*,?\s*\d{4}).*?((?:Paid\s*to|Received\s*from)\s*.*?)UPI.*?₹\s*([\d,]+\.?\d*)',
+    re.DOTALL | re.IGNORECASE
+)
+DATE_JUNK_RE = re.compile(r'[^\d\w,]')
+DATE_RE = re.compile(r'(\d{1,2})(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*,?(\d{4})', re.IGNORECASE)
+RECEIVED_NAME_RE = re.compile(r'Received\s*from\s*([A-Z][A-Za-z0-9\s]+?)(?=\s*UPI|Transaction)', re.IGNORECASE)
+PAID_NAME_RE = re.compile(r'Paid\s*to\s*([A-Z][A-Za-z0-9\s]+?)(?=\s*UPI|Transaction)', re.IGNORECASE)
+WS_RE = re.compile(r'\s+')
+DESC_TAIL_RE = re.compile(r'(?:UPI|Transaction).*')
+
+# Type is categorical so KPI grouping and tab splits work on integer codes
+TXN_TYPES = ['Sent', 'Received']
+
+@st.cache_data(show_spinner=False)
+def extract_gpay_transactions(pdf_bytes):
     """
-    Extract transaction data from GPay PDF statement
-    Focus on Send/Receive KPIs
+    Extract transaction data from GPay PDF statement bytes
+    Focus on Send/Receive KPIs (cached per file content across reruns)
     """
+    pdf_file = BytesIO(pdf_bytes)
     
-    # Read PDF
-    pdf_reader = PyPDF2.PdfReader(pdf_file)
-    all_text = ""
+    # Read PDF (PDFium's native extractor; PyPDF2 when pypdfium2 is missing or cannot open the file)
+    all_text = None
+    if pdfium is not None:
+        try:
+            pdf = pdfium.PdfDocument(pdf_file.read())
+            try:
+                all_text = "\n".join(page.get_textpage().get_text_range() for page in pdf)
+            finally:
+                pdf.close()
+        except Exception:
+            pdf_file.seek(0)
+
+    if all_text is None:
+        import PyPDF2
+        pdf_reader = PyPDF2.PdfReader(pdf_file)
+        
+        # Extract text from all pages in one join
+        all_text = "".join((page.extract_text() or "") for page in pdf_reader.pages)
     
-    # Extract text from all pages
-    for page in pdf_reader.pages:
-        all_text += page.extract_text()
+    matches = TXN_RE.findall(all_text)
     
-    transactions = []
+    st.write(f"**🔍 Debug: Found {len(matches)} raw pattern matches**")
     
-    # Enhanced pattern to capture all transaction variations
-    # This pattern is more flexible to handle various PDF formatting issues
-    pattern = r'(\d{1,2}\s*(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*,?\s*\d{4}).*?((?:Paid\s*to|Received\s*from|Paidto|Receivedfrom|Paid to|Received from)\s*.*?)(?:UPI|upi).*?₹\s*([\d,]+\.?\d*)'
+    raw = pd.DataFrame(matches, columns=['date_str', 'full_desc', 'amount_str'])
+    full_lower = raw['full_desc'].str.lower()
     
-    matches = re.findall(pattern, all_text, re.DOTALL | re.IGNORECASE)
+    # Parse date
+    date_parts = raw['date_str'].str.replace(DATE_JUNK_RE, '', regex=True).str.extract(DATE_RE)
+    date = pd.to_datetime(date_parts[0] + ' ' + date_parts[1].str.title() + ' ' + date_parts[2],
+                          format='%d %b %Y', errors='coerce')
     
-    st.write(f"**🔍 Debug: Found {len(matches)} raw pattern matches**")
+    # Determine transaction type
+    is_received = full_lower.str.contains('received', regex=False) | \
+        full_lower.str.replace(' ', '', regex=False).str.contains('receivedfrom', regex=False)
     
-    for match in matches:
-        try:
-            date_str, full_desc, amount_str = match
-            
-            # Skip self-transfers early (mentioned in PDF header)
-            if 'self transfer' in full_desc.lower().replace(' ', ''):
-                continue
-            
-            # Parse date
-            date_clean = re.sub(r'[^\d\w,]', '', date_str)
-            date_match = re.search(r'(\d{1,2})(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*,?(\d{4})', date_clean, re.IGNORECASE)
-            
-            if not date_match:
-                continue
-                
-            day, month, year = date_match.groups()
-            date = datetime.strptime(f"{day} {month} {year}", '%d %b %Y')
-            
-            # Determine transaction type
-            is_received = 'received' in full_desc.lower() or 'receivedfrom' in full_desc.lower().replace(' ', '')
-            transaction_type = 'Received' if is_received else 'Sent'
-            
-            # Extract merchant/person name
-            if is_received:
-                desc_match = re.search(r'(?:Received\s*from|Receivedfrom)\s*([A-Z][A-Za-z0-9\s]+?)(?=\s*UPI|\s*upi|Transaction)', full_desc, re.IGNORECASE)
-            else:
-                desc_match = re.search(r'(?:Paid\s*to|Paidto)\s*([A-Z][A-Za-z0-9\s]+?)(?=\s*UPI|\s*upi|Transaction)', full_desc, re.IGNORECASE)
-            
-            if desc_match:
-                description = desc_match.group(1).strip()
-            else:
-                description = full_desc[:50].strip()
-            
-            # Clean description
-            description = re.sub(r'\s+', ' ', description)
-            description = description.replace('Paid to', '').replace('Received from', '').strip()
-            description = description.split('UPI')[0].split('Transaction')[0].strip()
-            
-            # Skip if description is too short or empty
-            if len(description) < 2:
-                continue
-            
-            # Parse amount - handle all decimal formats
-            amount_clean = amount_str.replace(',', '').strip()
-            amount = float(amount_clean)
-            
-            # Skip invalid amounts
-            if amount <= 0:
-                continue
-            
-            # Skip rewards but NOT other valid Google Pay transactions
-            skip_keywords = ['google pay rewards', 'googlepayrewards']
-            if any(keyword in description.lower().replace(' ', '') for keyword in skip_keywords):
-                continue
-            
-            transactions.append({
-                'Date': date,
-                'Description': description,
-                'Amount': amount,
-                'Type': transaction_type
-            })
-            
-        except Exception as e:
-            continue
+    # Extract merchant/person name
+    received_name = raw['full_desc'].str.extract(RECEIVED_NAME_RE)[0]
+    paid_name = raw['full_desc'].str.extract(PAID_NAME_RE)[0]
+    description = received_name.where(is_received, paid_name).str.strip()
+    description = description.fillna(raw['full_desc'].str[:50].str.strip())
+    
+    # Clean description
+    description = description.str.replace(WS_RE, ' ', regex=True)
+    description = description.str.replace('Paid to', '', regex=False).str.replace('Received from', '', regex=False).str.strip()
+    description = description.str.replace(DESC_TAIL_RE, '', regex=True).str.strip()
+    
+    # Parse amount - handle all decimal formats
+    amount = pd.to_numeric(raw['amount_str'].str.replace(',', '', regex=False).str.strip(), errors='coerce')
     
-    # Create DataFrame
-    df = pd.DataFrame(transactions)
+    # Keep dated rows with a real description and positive amount; skip rewards but NOT other Google Pay transactions
+    is_reward = description.str.lower().str.replace(' ', '', regex=False).str.contains('googlepayrewards', regex=False)
+    keep = date.notna() & (description.str.len() >= 2) & (amount > 0) & ~is_reward
+    
+    df = pd.DataFrame({
+        'Date': date[keep],
+        'Description': description[keep].astype('string[pyarrow]'),  # one Arrow buffer, not Python objects
+        'Amount': amount[keep],
+        'Type': pd.Categorical(np.where(is_received[keep], 'Received', 'Sent'), categories=TXN_TYPES)
+    }).reset_index(drop=True)
+    total_before = len(df)
     
     # Remove duplicates - be more careful about what we consider duplicates
     if not df.empty:
-        # Only remove if EXACT match on all three fields
-        df = df.drop_duplicates(subset=['Date', 'Description', 'Amount'], keep='first')
-        df = df.sort_values('Date')
+        # Only remove if EXACT match on all three fields; a stable sort first keeps
+        # document order within a day, so 'first' is still the earliest occurrence
+        df = df.sort_values('Date', kind='mergesort', ignore_index=True)
+        df = df.drop_duplicates(subset=['Date', 'Description', 'Amount'], keep='first', ignore_index=True)
         
         # Debug: Show totals before and after deduplication
-        total_before = len(transactions)
         total_after = len(df)
         if total_before != total_after:
             st.write(f"⚠️ Removed {total_before - total_after} duplicate entries")
     
     return df
 
+@st.cache_data(show_spinner=False)
+def export_excel(df):
+    """Excel (xlsxwriter) bytes of the parsed transactions, built once per statement"""
+    buffer = BytesIO()
+    df.to_excel(buffer, index=False, engine="xlsxwriter")
+    return buffer.getvalue()
+
 # =========================================================
 # STREAMLIT UI - KPI FOCUSED
 # =========================================================
@@ -123,16 +131,17 @@ uploaded_pdf = st.file_uploader("📎 Upload GPay PDF Statement", type=['pdf'])
 if uploaded_pdf:
     with st.spinner("🔄 Processing..."):
         try:
-            df = extract_gpay_transactions(uploaded_pdf)
+            df = extract_gpay_transactions(uploaded_pdf.getvalue())
             
             if not df.empty:
-                # Calculate KPIs
-                total_sent = df[df['Type'] == 'Sent']['Amount'].sum()
-                total_received = df[df['Type'] == 'Received']['Amount'].sum()
+                # Calculate KPIs (one grouping pass for both types)
+                kpis = df.groupby('Type', observed=False)['Amount'].agg(['sum', 'count'])
+                total_sent = kpis.at['Sent', 'sum']
+                total_received = kpis.at['Received', 'sum']
                 net_position = total_sent - total_received
                 
-                sent_count = len(df[df['Type'] == 'Sent'])
-                received_count = len(df[df['Type'] == 'Received'])
+                sent_count = int(kpis.at['Sent', 'count'])
+                received_count = int(kpis.at['Received', 'count'])
                 
                 # Date range
                 date_from = df['Date'].min().strftime('%d %b %Y')
@@ -188,47 +197,45 @@ if uploaded_pdf:
                 # Transaction Breakdown
                 st.markdown("## 📋 Transaction Details")
                 
+                # Formatting happens in the browser; the columns stay numeric/datetime and sortable
+                column_config = {
+                    'Date': st.column_config.DateColumn('Date', format='DD MMM YYYY'),
+                    'Amount': st.column_config.NumberColumn('Amount', format='₹%,.2f')
+                }
+                by_type = dict(tuple(df.groupby('Type', sort=False, observed=True)))
+                
                 tab1, tab2, tab3 = st.tabs(["💸 Sent", "💰 Received", "📊 All"])
                 
                 with tab1:
-                    sent_df = df[df['Type'] == 'Sent'].copy()
+                    sent_df = by_type.get('Sent', df.iloc[:0])
                     if not sent_df.empty:
-                        sent_df['Date'] = sent_df['Date'].dt.strftime('%d %b %Y')
-                        sent_df['Amount'] = sent_df['Amount'].apply(lambda x: f"₹{x:,.2f}")
-                        st.dataframe(sent_df[['Date', 'Description', 'Amount']], use_container_width=True, hide_index=True)
+                        st.dataframe(sent_df[['Date', 'Description', 'Amount']], column_config=column_config,
+                                     use_container_width=True, hide_index=True)
                     else:
                         st.info("No sent transactions found")
                 
                 with tab2:
-                    received_df = df[df['Type'] == 'Received'].copy()
+                    received_df = by_type.get('Received', df.iloc[:0])
                     if not received_df.empty:
-                        received_df['Date'] = received_df['Date'].dt.strftime('%d %b %Y')
-                        received_df['Amount'] = received_df['Amount'].apply(lambda x: f"₹{x:,.2f}")
-                        st.dataframe(received_df[['Date', 'Description', 'Amount']], use_container_width=True, hide_index=True)
+                        st.dataframe(received_df[['Date', 'Description', 'Amount']], column_config=column_config,
+                                     use_container_width=True, hide_index=True)
                     else:
                         st.info("No received transactions found")
                 
                 with tab3:
-                    all_df = df.copy()
-                    all_df['Date'] = all_df['Date'].dt.strftime('%d %b %Y')
-                    all_df['Amount'] = all_df['Amount'].apply(lambda x: f"₹{x:,.2f}")
-                    st.dataframe(all_df[['Date', 'Description', 'Amount', 'Type']], use_container_width=True, hide_index=True)
+                    st.dataframe(df[['Date', 'Description', 'Amount', 'Type']], column_config=column_config,
+                                 use_container_width=True, hide_index=True)
                 
                 st.markdown("---")
                 
                 # Download Excel
                 st.markdown("## 💾 Export Data")
                 
-                buffer = BytesIO()
-                export_df = df.copy()
-                export_df.to_excel(buffer, index=False)
-                buffer.seek(0)
-                
                 filename = f"gpay_transactions_{df['Date'].min().strftime('%Y%m%d')}_{df['Date'].max().strftime('%Y%m%d')}.xlsx"
                 
                 st.download_button(
                     label="📥 Download Excel",
-                    data=buffer,
+                    data=export_excel(df),
                     file_name=filename,
                     mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                     use_container_width=True
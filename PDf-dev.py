@@ -7,16 +7,12 @@ import calendar
 import gdown
 from pathlib import Path
 import shutil
-import PyPDF2
-import re
-from datetime import datetime
 
-# Try importing fuzzywuzzy, warn if missing
-try:
-    from fuzzywuzzy import fuzz
-except ImportError:
-    st.error("⚠️ 'fuzzywuzzy' library is missing. Please add 'fuzzywuzzy' and 'python-Levenshtein' to your requirements.txt")
-    fuzz = None
+from gpay_utils import process_pdf_data, logic_merchants, best_merchant_match, fuzz, MATCH_THRESHOLD
+
+# Warn if rapidfuzz is missing
+if fuzz is None:
+    st.error("⚠️ 'rapidfuzz' library is missing. Please add 'rapidfuzz' to your requirements.txt")
 
 # =========================================================
 # CONFIG
@@ -28,214 +24,6 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
-# =========================================================
-# PDF EXTRACTION FUNCTIONS
-# =========================================================
-def extract_gpay_transactions_from_pdf(pdf_file):
-    """
-    Extract transaction data from GPay PDF statement.
-    Handles 'Date', 'Description', 'Amount', 'Transaction ID', 'Bank', and 'Time'.
-    Explicitly IGNORES 'Self transfer' transactions.
-    """
-    
-    # Read PDF
-    pdf_reader = PyPDF2.PdfReader(pdf_file)
-    all_text = ""
-    
-    for page in pdf_reader.pages:
-        all_text += page.extract_text()
-    
-    transactions = []
-    
-    # --- REGEX PATTERN EXPLAINED ---
-    # 1. Date: (\d{1,2}\s*[A-Za-z]{3},?\s*\d{4}) -> Matches "01 Oct, 2025"
-    # 2. Time (Optional): (?:\d{1,2}:\d{2}\s*[AP]M)? -> Matches "10:01 AM" (non-capturing group mostly, we capture later if needed)
-    # 3. Type & Desc: (Paid\s*to|Received\s*from|Self\s*transfer\s*to)\s*(.*?) -> Matches "Paid to ZEPTONOW"
-    # 4. Amount: ₹\s*([\d,]+\.?\d*) -> Matches "₹26" or "₹1,000"
-    # 5. ID: UPI Transaction ID:\s*(\d+) -> Matches the 12-digit ID
-    # 6. Bank: (?:Paid\s*(?:by|to)\s*(.*?))? -> Matches "Paid by Canara Bank 7191"
-    
-    # We use re.DOTALL so '.' matches newlines, allowing us to capture multi-line blocks
-    pattern = r'(\d{1,2}\s*[A-Za-z]{3},?\s*\d{4}).*?(Paid\s*to|Received\s*from|Self\s*transfer\s*to)\s+(.*?)(?:\s+UPI|\s+₹).*?₹\s*([\d,]+\.?\d*).*?UPI Transaction ID:\s*(\d+)(?:.*?Paid\s*(?:by|to)\s*(.*?))?'
-    
-    # Find all matches in the text block
-    matches = re.findall(pattern, all_text, re.DOTALL | re.IGNORECASE)
-    
-    for match in matches:
-        try:
-            date_str, type_str, description_raw, amount_str, trans_id, bank_raw = match
-            
-            # --- 1. IGNORE SELF TRANSFERS ---
-            # Check both the type string and description for "Self transfer"
-            full_check = (type_str + " " + description_raw).lower().replace(' ', '')
-            if 'selftransfer' in full_check:
-                continue
-            
-            # --- 2. PARSE DATE ---
-            # Remove commas and clean up
-            date_clean = re.sub(r'[^\d\w]', ' ', date_str).strip()
-            # Standardize spacing (e.g., "01 Oct  2025" -> "01 Oct 2025")
-            date_clean = re.sub(r'\s+', ' ', date_clean)
-            try:
-                date = datetime.strptime(date_clean, '%d %b %Y')
-            except ValueError:
-                # Fallback for "01 Oct, 2025" format
-                date = datetime.strptime(date_clean, '%d %b %Y')
-
-            # --- 3. PARSE AMOUNT ---
-            amount_clean = amount_str.replace(',', '').strip()
-            amount = float(amount_clean)
-            if amount <= 0:
-                continue
-
-            # --- 4. CLEAN DESCRIPTION ---
-            # Description often contains newlines or "UPI..." text if regex grabbed too much
-            description = description_raw.strip()
-            # Remove "UPI Transaction ID" if it accidentally got into description
-            description = description.split('UPI Transaction')[0].strip()
-            # Remove extra spaces
-            description = re.sub(r'\s+', ' ', description)
-            
-            # Skip if description is too short/empty
-            if len(description) < 2:
-                continue
-                
-            # Filter out Rewards
-            skip_keywords = ['google pay rewards', 'googlepayrewards', 'better luck next time']
-            if any(keyword in description.lower().replace(' ', '') for keyword in skip_keywords):
-                continue
-
-            # --- 5. DETERMINE TYPE ---
-            is_received = 'received' in type_str.lower()
-            transaction_type = 'Received' if is_received else 'Sent'
-            
-            # --- 6. CLEAN BANK ---
-            bank = bank_raw.strip() if bank_raw else "Unknown"
-            
-            transactions.append({
-                'Date': date,
-                'Description': description,
-                'Amount': amount,
-                'Type': transaction_type,
-                'Transaction ID': trans_id,  # Useful for deduplication
-                'Bank': bank
-            })
-            
-        except Exception as e:
-            # print(f"Error parsing row: {e}") # Debugging
-            continue
-    
-    # Create DataFrame
-    df = pd.DataFrame(transactions)
-    
-    # Remove duplicates based on Transaction ID (Very accurate)
-    if not df.empty:
-        if 'Transaction ID' in df.columns:
-            df = df.drop_duplicates(subset=['Transaction ID'], keep='first')
-        else:
-            df = df.drop_duplicates(subset=['Date', 'Description', 'Amount'], keep='first')
-            
-        df = df.sort_values('Date')
-    
-    return df
-
-def categorize_transaction(description, amount, logic_sheet_df):
-    """Categorize transaction using smart fuzzy matching"""
-    
-    # 1. Fuzzy Matching against Logic Sheet
-    if not logic_sheet_df.empty and fuzz is not None:
-        best_match_score = 0
-        best_match_row = None
-        
-        # Lowercase description for better matching
-        desc_search = str(description).lower()
-        
-        for idx, row in logic_sheet_df.iterrows():
-            # Force string conversion
-            merchant = str(row.get('Merchant', '')).strip().lower()
-            
-            if not merchant:
-                continue
-            
-            # Use TOKEN SET RATIO (Best for partial matches like "Uber Rides" matching "Uber")
-            score = fuzz.token_set_ratio(desc_search, merchant)
-            
-            if score > best_match_score:
-                best_match_score = score
-                best_match_row = row
-        
-        # Threshold set to 70 (Less strict)
-        if best_match_score >= 70 and best_match_row is not None:
-            sub_cat = str(best_match_row.get('Subcategory', 'Yet to Name'))
-            return (
-                str(best_match_row.get('Category', 'Misc')),
-                sub_cat
-            )
-    
-    # 2. Heuristic Rules (Fallback)
-    desc_lower = description.lower()
-    
-    # Transport: Small amounts (₹15-₹50) OR transport keywords
-    transport_keywords = ['rapido', 'auto', 'ola', 'uber', 'metro', 'mmrda', 'railway', 'irctc', 'train', 'bus']
-    if (15 <= amount <= 50) or any(kw in desc_lower for kw in transport_keywords):
-        if any(kw in desc_lower for kw in ['metro', 'mmrda']):
-            return ('Transport', 'Metro')
-        elif any(kw in desc_lower for kw in ['railway', 'irctc', 'train']):
-            return ('Transport', 'Train')
-        else:
-            return ('Transport', 'Auto')
-    
-    # Default: Uncategorized
-    return ('Misc', 'Yet to Name')
-
-def process_pdf_data(pdf_files, logic_sheet_df):
-    """Process multiple PDF files and categorize transactions"""
-    all_transactions = []
-    
-    for pdf_path in pdf_files:
-        try:
-            with open(pdf_path, 'rb') as f:
-                df = extract_gpay_transactions_from_pdf(f)
-                if not df.empty:
-                    all_transactions.append(df)
-        except Exception as e:
-            st.warning(f"Could not process {Path(pdf_path).name}")
-    
-    if not all_transactions:
-        return pd.DataFrame()
-    
-    # Combine all PDFs
-    combined_df = pd.concat(all_transactions, ignore_index=True)
-    
-    # Check for Transaction ID column availability for robust deduplication across files
-    if 'Transaction ID' in combined_df.columns:
-        combined_df = combined_df.drop_duplicates(subset=['Transaction ID'], keep='first')
-    
-    # Categorize each transaction
-    combined_df['Category'] = 'Misc'
-    combined_df['Sub Category'] = 'Yet to Name'
-    
-    # Pass the loaded logic sheet to the categorizer
-    for idx, row in combined_df.iterrows():
-        # Skip received transactions (Income)
-        if row['Type'] == 'Received':
-            combined_df.at[idx, 'Category'] = 'Income'
-            combined_df.at[idx, 'Sub Category'] = 'Received'
-        else:
-            category, subcategory = categorize_transaction(
-                row['Description'], 
-                row['Amount'], 
-                logic_sheet_df
-            )
-            combined_df.at[idx, 'Category'] = category
-            combined_df.at[idx, 'Sub Category'] = subcategory
-    
-    # Filter out received transactions for expense tracking
-    expense_df = combined_df[combined_df['Type'] == 'Sent'].copy()
-    expense_df = expense_df.drop('Type', axis=1)
-    
-    return expense_df
-
 # =========================================================
 # AUTHENTICATION
 # =========================================================
@@ -327,12 +115,11 @@ def login_page():
         st.markdown('<div class="login-title">💳 Expense Intelligence</div>', unsafe_allow_html=True)
         st.markdown('<div class="login-subtitle">Designed for awareness, not anxiety</div>', unsafe_allow_html=True)
         
-        username = st.text_input("Username", placeholder="Enter your username", key="login_user")
-        password = st.text_input("Password", type="password", placeholder="Enter your password", key="login_pass")
-        
-        st.markdown('<div class="login-button">', unsafe_allow_html=True)
-        login_btn = st.button("🔐 Login", use_container_width=True)
-        st.markdown('</div>', unsafe_allow_html=True)
+        # One rerun on submit instead of one per edited field
+        with st.form(key="login_form"):
+            username = st.text_input("Username", placeholder="Enter your username", key="login_user")
+            password = st.text_input("Password", type="password", placeholder="Enter your password", key="login_pass")
+            login_btn = st.form_submit_button("🔐 Login", use_container_width=True)
         
         if login_btn:
             if username and password:
@@ -567,21 +354,16 @@ def load_logic_sheet(link):
                 st.write("🔎 **Test Your Logic**")
                 test_txt = st.text_input("Type a merchant name...", placeholder="e.g. Swiggy")
                 if test_txt and fuzz:
-                    best_s = 0
-                    best_r = None
-                    for _, r in df.iterrows():
-                        mer = str(r['Merchant']).lower()
-                        sc = fuzz.token_set_ratio(test_txt.lower(), mer)
-                        if sc > best_s:
-                            best_s = sc
-                            best_r = r
-                    
-                    st.write(f"Best Match: **{best_r['Merchant']}**")
-                    st.write(f"Score: **{best_s}**")
-                    if best_s >= 70:
+                    match = best_merchant_match(test_txt, logic_merchants(df))
+                    if match:
+                        _, best_s, best_idx = match
+                        best_r = df.loc[best_idx]
+                        st.write(f"Best Match: **{best_r['Merchant']}**")
+                        st.write(f"Score: **{best_s:.0f}**")
+                    if match and best_s >= MATCH_THRESHOLD:
                         st.success(f"✅ Matched: {best_r['Category']}")
                     else:
-                        st.error("❌ No Match (<70)")
+                        st.error(f"❌ No Match (<{MATCH_THRESHOLD})")
             else:
                 st.error("❌ Missing Columns")
                 st.write(f"Found: {list(df.columns)}")
@@ -613,13 +395,13 @@ def generate_insights(current_month_df, previous_month_df, amt_col):
             insights.append(f"📊 Your spending is stable at ₹{current_total:,.0f}, similar to last month (₹{prev_total:,.0f})")
     
     current_cat = current_month_df.groupby("Category")[amt_col].sum()
-    prev_cat = previous_month_df.groupby("Category")[amt_col].sum() if not previous_month_df.empty else pd.Series()
+    prev_cat = previous_month_df.groupby("Category")[amt_col].sum() if not previous_month_df.empty else pd.Series(dtype=float)
+    prev_cat = prev_cat.reindex(current_cat.index, fill_value=0)
     
-    for cat in current_cat.index:
-        if cat in prev_cat.index and prev_cat[cat] > 0:
-            cat_change = ((current_cat[cat] - prev_cat[cat]) / prev_cat[cat]) * 100
-            if cat_change > 25:
-                insights.append(f"⚠️ {cat} spending jumped by {cat_change:.1f}% (₹{current_cat[cat]:,.0f} vs ₹{prev_cat[cat]:,.0f})")
+    has_prev = prev_cat > 0
+    cat_change = (current_cat[has_prev] - prev_cat[has_prev]) / prev_cat[has_prev] * 100
+    for cat in cat_change.index[cat_change > 25]:
+        insights.append(f"⚠️ {cat} spending jumped by {cat_change[cat]:.1f}% (₹{current_cat[cat]:,.0f} vs ₹{prev_cat[cat]:,.0f})")
     
     weekend_avg = current_month_df[current_month_df["WeekType"] == "Weekend"].groupby(current_month_df[detect(current_month_df, ["date"])])[amt_col].sum().mean()
     weekday_avg = current_month_df[current_month_df["WeekType"] == "Weekday"].groupby(current_month_df[detect(current_month_df, ["date"])])[amt_col].sum().mean()
@@ -742,25 +524,31 @@ if not dfs:
     st.info("📁 Click 'Sync Now' to load data")
     st.stop()
 
-df = pd.concat(dfs, ignore_index=True)
-
 # =========================================================
 # DATA PREP
 # =========================================================
-date_col = detect(df, ["date"])
-amt_col = detect(df, ["amount"])
-cat_col = detect(df, ["category"])
-sub_col = detect(df, ["sub"])
-desc_col = detect(df, ["merchant","description","name"])
-
-df[date_col] = pd.to_datetime(df[date_col])
-df[amt_col] = pd.to_numeric(df[amt_col], errors="coerce").fillna(0)
-df["Category"] = df.get(cat_col, "Uncategorized")
-df["Sub Category"] = df.get(sub_col, "Uncategorized")
-df["Description"] = df.get(desc_col, "Unknown")
-df["Month"] = df[date_col].dt.to_period("M").astype(str)
-df["Weekday"] = df[date_col].dt.day_name()
-df["WeekType"] = np.where(df[date_col].dt.weekday >= 5, "Weekend", "Weekday")
+@st.cache_data(show_spinner=False)
+def prep_data(dfs):
+    """Combine the loaded frames and derive the typed/calendar columns (skipped on reruns with unchanged data)"""
+    df = pd.concat(dfs, ignore_index=True)
+    
+    date_col = detect(df, ["date"])
+    amt_col = detect(df, ["amount"])
+    cat_col = detect(df, ["category"])
+    sub_col = detect(df, ["sub"])
+    desc_col = detect(df, ["merchant","description","name"])
+    
+    df[date_col] = pd.to_datetime(df[date_col])
+    df[amt_col] = pd.to_numeric(df[amt_col], errors="coerce").fillna(0)
+    df["Category"] = df.get(cat_col, "Uncategorized")
+    df["Sub Category"] = df.get(sub_col, "Uncategorized")
+    df["Description"] = df.get(desc_col, "Unknown")
+    df["Month"] = df[date_col].dt.to_period("M").astype(str)
+    df["Weekday"] = df[date_col].dt.day_name()
+    df["WeekType"] = np.where(df[date_col].dt.weekday >= 5, "Weekend", "Weekday")
+    return df, date_col, amt_col
+
+df, date_col, amt_col = prep_data(dfs)
 
 # =========================================================
 # FILTERS
@@ -817,12 +605,16 @@ with tab1:
 with tab2:
     st.markdown(f"### 📅 {format_month(selected_month)} Overview")
     
+    # Non-bill per-day and per-category sums, grouped once for the KPIs and the burn-down
+    non_bill_daily = non_bill_df.groupby(date_col)[amt_col].sum()
+    non_bill_cat = non_bill_df.groupby("Category")[amt_col].sum()
+    
     k1,k2,k3,k4 = st.columns(4)
     kpis = [
         (k1,"Total Spend",month_df[amt_col].sum()),
         (k2,"Excl. Bills",non_bill_df[amt_col].sum()),
-        (k3,"Daily Avg",non_bill_df.groupby(date_col)[amt_col].sum().mean()),
-        (k4,"Top Category",non_bill_df.groupby("Category")[amt_col].sum().idxmax() if not non_bill_df.empty else "N/A")
+        (k3,"Daily Avg",non_bill_daily.mean()),
+        (k4,"Top Category",non_bill_cat.idxmax() if not non_bill_df.empty else "N/A")
     ]
     for col,title,val in kpis:
         display = f"₹{val:,.0f}" if isinstance(val,(int,float,np.number)) else str(val)
@@ -841,8 +633,7 @@ with tab2:
             int(selected_month.split("-")[1])
         )[1]
         daily = (
-            non_bill_df.groupby(date_col)[amt_col]
-            .sum()
+            non_bill_daily
             .reindex(pd.date_range(month_df[date_col].min(),
                                    month_df[date_col].max()), fill_value=0)
             .cumsum()
@@ -999,7 +790,7 @@ with tab4:
 # =========================================================
 with tab5:
     buf = BytesIO()
-    df.sort_values(date_col).to_excel(buf, index=False)
+    df.sort_values(date_col).to_excel(buf, index=False, engine="xlsxwriter")
     buf.seek(0)
     st.download_button(
         "Download Clean Excel",
@@ -112,12 +112,11 @@ def login_page():
         st.markdown('<div class="login-title">💳 Expense Intelligence</div>', unsafe_allow_html=True)
         st.markdown('<div class="login-subtitle">Designed for awareness, not anxiety</div>', unsafe_allow_html=True)
         
-        username = st.text_input("Username", placeholder="Enter your username", key="login_user")
-        password = st.text_input("Password", type="password", placeholder="Enter your password", key="login_pass")
-        
-        st.markdown('<div class="login-button">', unsafe_allow_html=True)
-        login_btn = st.button("🔐 Login", use_container_width=True)
-        st.markdown('</div>', unsafe_allow_html=True)
+        # One rerun on submit instead of one per edited field
+        with st.form(key="login_form"):
+            username = st.text_input("Username", placeholder="Enter your username", key="login_user")
+            password = st.text_input("Password", type="password", placeholder="Enter your password", key="login_pass")
+            login_btn = st.form_submit_button("🔐 Login", use_container_width=True)
         
         if login_btn:
             if username and password:
@@ -671,7 +670,7 @@ with tab4:
 # =========================================================
 with tab5:
     buf = BytesIO()
-    df.sort_values(date_col).to_excel(buf, index=False)
+    df.sort_values(date_col).to_excel(buf, index=False, engine="xlsxwriter")
     buf.seek(0)
     st.download_button(
         "Download Clean Excel",
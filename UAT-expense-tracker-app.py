@@ -1,14 +1,13 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import plotly.express as px
 from io import BytesIO
 import calendar
-import gdown
 from pathlib import Path
 import shutil
 import re
 import requests
+from functools import lru_cache
 
 # =========================================================
 # PAGE CONFIG
@@ -310,6 +309,18 @@ def get_chart_config():
         'displaylogo': False,
     }
 
+def frame_key(df):
+    """Small content key for a DataFrame (shape, columns and row hashes)"""
+    return (len(df), tuple(df.columns), int(pd.util.hash_pandas_object(df, index=False).sum()))
+
+@st.cache_data(show_spinner=False)
+def to_excel_bytes(_df, key):
+    """Excel export of _df, cached on its content key instead of hashing the frame"""
+    buf = BytesIO()
+    with pd.ExcelWriter(buf, engine="xlsxwriter") as writer:
+        _df.to_excel(writer, index=False)
+    return buf.getvalue()
+
 def extract_folder_id_from_link(link):
     """Extract Google Drive folder ID from URL"""
     if not link or pd.isna(link):
@@ -396,6 +407,9 @@ def get_files_from_drive_folder(folder_id):
     """Download files from Drive folder using gdown"""
     add_debug_log(f"Downloading files from folder: {folder_id}")
     
+    # Only needed on a sync, so not imported at script start
+    import gdown
+    
     try:
         temp_dir = Path("temp_data")
         if temp_dir.exists():
@@ -482,15 +496,20 @@ def load_data_from_drive(folder_id, manual_sheet_links=None):
     
     return dfs, file_info
 
+TIME_RE = re.compile(r'(\d{1,2}):(\d{2})(?::\d{2})?\s*(AM|PM)?')
+
 def parse_time_to_hour(time_val):
     """Parse time value to hour (0-23)"""
     if pd.isna(time_val):
         return 12
     
-    time_str = str(time_val).strip().upper()
-    
+    return hour_from_time_str(str(time_val).strip().upper())
+
+@lru_cache(maxsize=2048)
+def hour_from_time_str(time_str):
+    """Hour for a normalized time string; statements repeat the same few times"""
     # 12-hour format
-    match = re.match(r'(\d{1,2}):(\d{2})(?::\d{2})?\s*(AM|PM)?', time_str)
+    match = TIME_RE.match(time_str)
     if match:
         hour = int(match.group(1))
         am_pm = match.group(3)
@@ -719,14 +738,21 @@ with st.sidebar:
     selected_month = st.selectbox("📅 Month", months, index=len(months)-1, format_func=format_month)
     st.caption(f"📊 {len(file_info)} sources • {sum(f['rows'] for f in file_info):,} rows")
 
-month_df = df[df["Month"] == selected_month]
-non_bill_df = month_df[month_df["Category"] != "Bill Payment"]
+# Row masks computed once and reused by the month slices and the Intelligence tab
+is_bill = (df["Category"] == "Bill Payment").to_numpy()
+in_month = (df["Month"] == selected_month).to_numpy()
+month_df = df[in_month]
+non_bill_df = df[in_month & ~is_bill]
 prev_idx = months.index(selected_month) - 1
 prev_month_df = df[df["Month"] == months[prev_idx]] if prev_idx >= 0 else pd.DataFrame()
 
 # =========================================================
 # TABS
 # =========================================================
+# Charting libraries load only once a user is logged in and data is ready
+import plotly.express as px
+import plotly.graph_objects as go
+
 tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["📈 Trends", "📅 Monthly", "💡 Insights", "🧠 Intelligence", "📤 Export", "🔧 Admin"])
 
 # =========================================================
@@ -754,9 +780,16 @@ with tab1:
 with tab2:
     st.markdown(f"### 📅 {format_month(selected_month)}")
     
+    # Month columns as contiguous arrays, shared by the bincount aggregations below
+    period_order = ["Morning (5AM-12PM)", "Afternoon (12PM-5PM)", "Evening (5PM-9PM)", "Night (9PM-5AM)"]
+    vals = month_df[amt_col].to_numpy(dtype=float)
+    cat_codes, cat_labels = pd.factorize(month_df["Category"], sort=True)
+    hour_codes = month_df["Hour"].to_numpy(dtype=np.int64)
+    period_codes = pd.Index(period_order).get_indexer(month_df["TimePeriod"])
+    
     # KPIs
     k1, k2, k3, k4 = st.columns(4)
-    total = month_df[amt_col].sum()
+    total = vals.sum()
     excl_bills = non_bill_df[amt_col].sum()
     daily_avg = non_bill_df.groupby(date_col)[amt_col].sum().mean() if not non_bill_df.empty else 0
     top_cat = non_bill_df.groupby("Category")[amt_col].sum().idxmax() if not non_bill_df.empty else "N/A"
@@ -788,7 +821,7 @@ with tab2:
     
     with right:
         st.markdown("#### 🧩 Composition")
-        if not month_df.empty and month_df[amt_col].sum() > 0:
+        if not month_df.empty and total > 0:
             chart_df = month_df.copy()
             tot = chart_df[amt_col].sum()
             cat_sums = chart_df.groupby("Category")[amt_col].sum()
@@ -801,8 +834,10 @@ with tab2:
     st.markdown("#### 📆 Patterns")
     c1, c2 = st.columns(2)
     with c1:
-        fig = px.bar(month_df.groupby("Category")[amt_col].sum().reset_index(), x="Category", y=amt_col, template="plotly_dark", title="By Category")
-        fig.update_layout(xaxis_fixedrange=True, yaxis_fixedrange=True)
+        cat_totals = np.bincount(cat_codes, weights=vals, minlength=len(cat_labels))
+        fig = go.Figure(go.Bar(x=list(cat_labels), y=cat_totals))
+        fig.update_layout(template="plotly_dark", title="By Category", xaxis_title="Category", yaxis_title=amt_col,
+                          xaxis_fixedrange=True, yaxis_fixedrange=True)
         st.plotly_chart(fig, use_container_width=True, config=get_chart_config())
     with c2:
         fig = px.bar(month_df.groupby(date_col)[amt_col].sum().reset_index(), x=date_col, y=amt_col, template="plotly_dark", title="By Day")
@@ -813,17 +848,17 @@ with tab2:
     st.markdown("#### ⏰ Time Analysis")
     h1, h2 = st.columns(2)
     with h1:
-        period_order = ["Morning (5AM-12PM)", "Afternoon (12PM-5PM)", "Evening (5PM-9PM)", "Night (9PM-5AM)"]
-        fig = px.bar(month_df.groupby("TimePeriod")[amt_col].sum().reindex(period_order).fillna(0).reset_index(), 
-                     x="TimePeriod", y=amt_col, template="plotly_dark", title="By Period", color="TimePeriod",
-                     color_discrete_sequence=["#FFD700","#FF8C00","#FF4500","#4169E1"])
-        fig.update_layout(showlegend=False, xaxis_fixedrange=True, yaxis_fixedrange=True)
+        known = period_codes >= 0
+        period_totals = np.bincount(period_codes[known], weights=vals[known], minlength=len(period_order))
+        fig = go.Figure(go.Bar(x=period_order, y=period_totals, marker_color=["#FFD700","#FF8C00","#FF4500","#4169E1"]))
+        fig.update_layout(template="plotly_dark", title="By Period", xaxis_title="TimePeriod", yaxis_title=amt_col,
+                          showlegend=False, xaxis_fixedrange=True, yaxis_fixedrange=True)
         st.plotly_chart(fig, use_container_width=True, config=get_chart_config())
     with h2:
-        hourly = pd.DataFrame({"Hour": range(24)}).merge(month_df.groupby("Hour")[amt_col].sum().reset_index(), how="left").fillna(0)
-        hourly["Label"] = hourly["Hour"].apply(lambda x: f"{int(x):02d}:00")
-        fig = px.bar(hourly, x="Label", y=amt_col, template="plotly_dark", title="By Hour")
-        fig.update_layout(xaxis_fixedrange=True, yaxis_fixedrange=True)
+        hour_totals = np.bincount(hour_codes, weights=vals, minlength=24)[:24]
+        fig = go.Figure(go.Bar(x=[f"{h:02d}:00" for h in range(24)], y=hour_totals))
+        fig.update_layout(template="plotly_dark", title="By Hour", xaxis_title="Label", yaxis_title=amt_col,
+                          xaxis_fixedrange=True, yaxis_fixedrange=True)
         fig.update_xaxes(tickangle=45)
         st.plotly_chart(fig, use_container_width=True, config=get_chart_config())
     
@@ -934,7 +969,7 @@ with tab4:
         st.info("No uncategorized")
     
     st.markdown("#### 🚨 Large (>₹3000)")
-    large = df[(df["Category"] != "Bill Payment") & (df[amt_col] > 3000)]
+    large = df[~is_bill & (df[amt_col].to_numpy() > 3000)]
     if not large.empty:
         st.dataframe(large[[date_col, "Description", amt_col]], use_container_width=True)
     else:
@@ -945,9 +980,8 @@ with tab4:
 # =========================================================
 with tab5:
     st.markdown("### 📤 Export")
-    buf = BytesIO()
-    df.sort_values(date_col).to_excel(buf, index=False)
-    st.download_button("📥 Download Excel", buf.getvalue(), "expense_data.xlsx")
+    export_df = df.sort_values(date_col)
+    st.download_button("📥 Download Excel", to_excel_bytes(export_df, frame_key(export_df)), "expense_data.xlsx")
 
 # =========================================================
 # TAB 6 - ADMIN
@@ -2,6 +2,7 @@ import streamlit as st
 import pandas as pd
 import re
 from datetime import datetime
+from functools import lru_cache
 import pdfplumber
 import gspread
 from google.oauth2.service_account import Credentials
@@ -11,6 +12,18 @@ from google.oauth2.service_account import Credentials
 # ==========================================
 SHEET_ID = "1NrNZ6adL8lsNRVFcpwmrTroHnem4I082Xv--_ruG43Y"
 
+# ==========================================
+# REGEX PATTERNS (compiled once)
+# ==========================================
+NON_ALPHA_SPACE_RE = re.compile(r'[^a-z\s]')
+WS_RE = re.compile(r'\s+')
+DIGIT_ALPHA_RE = re.compile(r'(?<=\d)(?=[A-Za-z])')
+LOWER_UPPER_RE = re.compile(r'(?<=[a-z])(?=[A-Z])')
+DATE_RE = re.compile(r'(\d{1,2})\s?([A-Za-z]{3}),\s?(\d{4})')
+AMOUNT_RE = re.compile(r'₹\s*([\d,]+\.?\d*)')
+PAIDTO_RE = re.compile("paidto", re.IGNORECASE)
+NON_ALPHA_RE = re.compile(r'[^A-Za-z ]')
+
 # ==========================================
 # GOOGLE SHEETS CONNECTION
 # ==========================================
@@ -47,15 +60,16 @@ def load_brain():
 STOP_WORDS = [
     "private", "limited", "ltd", "pvt", "marketplace"
 ]
+# All stop words stripped in one scan instead of one str.replace per word
+STOP_WORDS_RE = re.compile("|".join(map(re.escape, STOP_WORDS)))
 
+# Statements repeat the same merchants, so each distinct name is normalized once
+@lru_cache(maxsize=4096)
 def normalize_merchant(name):
     name = str(name).lower()
-    name = re.sub(r'[^a-z\s]', ' ', name)
-
-    for word in STOP_WORDS:
-        name = name.replace(word, "")
-
-    name = re.sub(r'\s+', ' ', name).strip()
+    name = NON_ALPHA_SPACE_RE.sub(' ', name)
+    name = STOP_WORDS_RE.sub("", name)
+    name = WS_RE.sub(' ', name).strip()
 
     return name.split()[0] if name else name
 
@@ -71,8 +85,8 @@ def parse_pdf(file):
             text = page.extract_text() or ""
 
             # clean spacing
-            text = re.sub(r'(?<=\d)(?=[A-Za-z])', ' ', text)
-            text = re.sub(r'(?<=[a-z])(?=[A-Z])', ' ', text)
+            text = DIGIT_ALPHA_RE.sub(' ', text)
+            text = LOWER_UPPER_RE.sub(' ', text)
 
             lines = text.split("\n")
 
@@ -80,28 +94,26 @@ def parse_pdf(file):
                 if "₹" not in line:
                     continue
 
+                # cheap substring checks before any regex: only "paid to" lines become rows
+                line_lower = line.lower()
+                if "received" in line_lower or "self transfer" in line_lower or "paidto" not in line_lower:
+                    continue
+
                 try:
-                    date_match = re.search(r'\d{1,2}\s?[A-Za-z]{3},\s?\d{4}', line)
-                    amt_match = re.search(r'₹\s*([\d,]+\.?\d*)', line)
+                    date_match = DATE_RE.search(line)
+                    amt_match = AMOUNT_RE.search(line)
 
                     if not date_match or not amt_match:
                         continue
 
-                    date = pd.to_datetime(date_match.group(), errors="coerce")
+                    # "d Mon YYYY" text, parsed for all rows at once below
+                    date = " ".join(date_match.groups())
                     amount = float(amt_match.group(1).replace(",", ""))
 
-                    line_lower = line.lower()
-
-                    if "received" in line_lower or "self transfer" in line_lower:
-                        continue
-
-                    if "paidto" in line_lower:
-                        merchant = re.split("paidto", line, flags=re.IGNORECASE)[1]
-                    else:
-                        continue
+                    merchant = PAIDTO_RE.split(line)[1]
 
                     merchant = merchant.split("₹")[0]
-                    merchant = re.sub(r'[^A-Za-z ]', '', merchant).strip()
+                    merchant = NON_ALPHA_RE.sub('', merchant).strip()
 
                     rows.append({
                         "Date": date,
@@ -112,7 +124,10 @@ def parse_pdf(file):
                 except:
                     continue
 
-    return pd.DataFrame(rows)
+    df = pd.DataFrame(rows)
+    if not df.empty:
+        df["Date"] = pd.to_datetime(df["Date"], format="%d %b %Y", errors="coerce", cache=True)
+    return df
 
 # ==========================================
 # BRAIN LOOKUP
@@ -121,21 +136,13 @@ def apply_brain(df, brain):
 
     df["merchant_key"] = df["Description"].apply(normalize_merchant)
 
-    categories = []
-    subcats = []
+    # Hash lookups for the whole column instead of a per-row loop
+    known = df["merchant_key"].isin(brain.keys())
+    categories = df["merchant_key"].map({k: v["category"] for k, v in brain.items()})
+    subcats = df["merchant_key"].map({k: v["sub_category"] for k, v in brain.items()})
 
-    for _, row in df.iterrows():
-        key = row["merchant_key"]
-
-        if key in brain:
-            categories.append(brain[key]["category"])
-            subcats.append(brain[key]["sub_category"])
-        else:
-            categories.append("Uncategorized")
-            subcats.append("Uncategorized")
-
-    df["Category"] = categories
-    df["Sub Category"] = subcats
+    df["Category"] = categories.where(known, "Uncategorized")
+    df["Sub Category"] = subcats.where(known, "Uncategorized")
 
     return df
 
@@ -144,18 +151,13 @@ def apply_brain(df, brain):
 # ==========================================
 def apply_rules(df):
 
-    for i, row in df.iterrows():
-
-        if row["Category"] != "Uncategorized":
-            continue
-
-        amount = row["Amount"]
-        hour = row["Date"].hour if pd.notna(row["Date"]) else 12
+    uncategorized = df["Category"] == "Uncategorized"
+    hour = df["Date"].dt.hour.fillna(12)
 
-        # RULE: auto
-        if 10 <= amount <= 60 and 7 <= hour <= 12:
-            df.at[i, "Category"] = "Transport"
-            df.at[i, "Sub Category"] = "Auto"
+    # RULE: auto
+    auto = uncategorized & df["Amount"].between(10, 60) & hour.between(7, 12)
+    df.loc[auto, "Category"] = "Transport"
+    df.loc[auto, "Sub Category"] = "Auto"
 
     return df
 
@@ -0,0 +1,278 @@
+# =========================================================
+# GPay PDF parsing + categorization shared by the PDF apps
+# (OnlyPDF-Dev-Claude.py, PDf-dev.py)
+# =========================================================
+import streamlit as st
+import pandas as pd
+import numpy as np
+import os
+from collections import namedtuple
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import re
+
+# pypdfium2 is the fast text extractor; PyPDF2 stays as the fallback and is
+# imported only when it is actually needed
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
+# RapidFuzz is optional; the apps warn when it is missing
+try:
+    from rapidfuzz import fuzz, process
+    from rapidfuzz.utils import default_process
+except ImportError:
+    fuzz = process = default_process = None
+
+MATCH_THRESHOLD = 70
+# RapidFuzz scores are floats; fuzzywuzzy rounded them, so 69.5 still counted as 70
+MATCH_CUTOFF = MATCH_THRESHOLD - 0.5
+
+# Fallback transport keywords, one alternation each
+TRANSPORT_KEYWORDS = ['rapido', 'auto', 'ola', 'uber', 'metro', 'mmrda', 'railway', 'irctc', 'train', 'bus']
+TRANSPORT_RE = re.compile('|'.join(map(re.escape, TRANSPORT_KEYWORDS)))
+# Transport subcategories in priority order (first match wins, the rest are 'Auto');
+# each keyword list is compiled into one alternation at import
+TRANSPORT_SUBCATEGORIES = [
+    ('Metro', ['metro', 'mmrda']),
+    ('Train', ['railway', 'irctc', 'train']),
+]
+TRANSPORT_SUBCATEGORY_RES = [(name, re.compile('|'.join(map(re.escape, keywords))))
+                             for name, keywords in TRANSPORT_SUBCATEGORIES]
+
+# =========================================================
+# PDF EXTRACTION FUNCTIONS
+# =========================================================
+# Statements are split on this anchor; the header (date, type, party, amount)
+# ends the chunk before it, the ID and "Paid by" bank line start the chunk after
+GPAY_TXN_ANCHOR = 'UPI Transaction ID:'
+GPAY_HEADER_RE = re.compile(
+    r'(\d{1,2}\s*[A-Za-z]{3},?\s*\d{4})\s*(Paid\s*to|Received\s*from|Self\s*transfer\s*to)\s+(.+?)\s*₹\s*([\d,]+\.?\d*)',
+    re.IGNORECASE
+)
+GPAY_TAIL_RE = re.compile(
+    r'\s*(\d+)(?:\s*Paid\s*(?:by|to)\s*([^\r\n]*?)(?=\d{1,2}\s*[A-Za-z]{3},?\s*\d{4}|[\r\n]|$))?',
+    re.IGNORECASE
+)
+# Self transfers, rewards and scratch-card misses are not real spends (one scan of type + description)
+GPAY_SKIP_RE = re.compile(r'self\s*transfer|google\s*pay\s*rewards|better\s*luck\s*next\s*time', re.IGNORECASE)
+DATE_CLEAN_RE = re.compile(r'[^\d\w]')
+WS_RE = re.compile(r'\s+')
+
+def read_pdf_text(pdf_file):
+    """All page text of a PDF; pypdfium2 first, PyPDF2 when it is unavailable or fails"""
+    if pdfium is not None:
+        try:
+            data = pdf_file.read()
+            pdf = pdfium.PdfDocument(data)
+            try:
+                return "\n".join(page.get_textpage().get_text_range() for page in pdf)
+            finally:
+                pdf.close()
+        except Exception:
+            pdf_file.seek(0)
+    
+    import PyPDF2
+    pdf_reader = PyPDF2.PdfReader(pdf_file)
+    return "".join((page.extract_text() or "") for page in pdf_reader.pages)
+
+
+def extract_gpay_transactions_from_pdf(pdf_file):
+    """
+    Extract transaction data from GPay PDF statement.
+    Handles 'Date', 'Description', 'Amount', 'Transaction ID', 'Bank', and 'Time'.
+    Explicitly IGNORES 'Self transfer' transactions.
+    """
+    
+    # Read PDF
+    all_text = read_pdf_text(pdf_file)
+    
+    transactions = []
+    
+    chunks = all_text.split(GPAY_TXN_ANCHOR)
+    
+    for before, after in zip(chunks, chunks[1:]):
+        try:
+            # The last header before the anchor belongs to this transaction
+            headers = GPAY_HEADER_RE.findall(before)
+            tail = GPAY_TAIL_RE.match(after)
+            if not headers or tail is None:
+                continue
+            
+            date_str, type_str, description_raw, amount_str = headers[-1]
+            trans_id, bank_raw = tail.groups()
+            
+            date_clean = DATE_CLEAN_RE.sub(' ', date_str).strip()
+            date_clean = WS_RE.sub(' ', date_clean)
+            
+            amount_clean = amount_str.replace(',', '').strip()
+            amount = float(amount_clean)
+            if amount <= 0:
+                continue
+            
+            description = description_raw.strip()
+            description = description.split('UPI Transaction')[0].strip()
+            description = WS_RE.sub(' ', description)
+            
+            if len(description) < 2:
+                continue
+                
+            if GPAY_SKIP_RE.search(type_str + " " + description):
+                continue
+            
+            is_received = 'received' in type_str.lower()
+            transaction_type = 'Received' if is_received else 'Sent'
+            
+            bank = bank_raw.strip() if bank_raw else "Unknown"
+            
+            transactions.append({
+                'Date': date_clean,
+                'Description': description,
+                'Amount': amount,
+                'Type': transaction_type,
+                'Transaction ID': trans_id,
+                'Bank': bank
+            })
+            
+        except Exception as e:
+            continue
+    
+    df = pd.DataFrame(transactions)
+    
+    if not df.empty:
+        # Parse all dates in one pass; unparseable ones are dropped
+        df['Date'] = pd.to_datetime(df['Date'], format='%d %b %Y', errors='coerce')
+        df = df.dropna(subset=['Date'])
+    
+    return df
+
+
+def _extract_one_pdf(pdf_path):
+    """Worker for process_pdf_data: parse one PDF by path, None if it fails"""
+    try:
+        with open(pdf_path, 'rb') as f:
+            return extract_gpay_transactions_from_pdf(f)
+    except Exception:
+        return None
+
+
+@st.cache_data(show_spinner=False)
+def logic_merchants(logic_sheet_df):
+    """Lower-cased logic sheet merchants keyed by row label, blanks dropped (cached across reruns)"""
+    if logic_sheet_df.empty or 'Merchant' not in logic_sheet_df.columns:
+        return {}
+    merchants = logic_sheet_df['Merchant'].astype(str).str.strip().str.lower()
+    return {idx: m for idx, m in merchants.items() if m}
+
+
+def best_merchant_match(text, merchants, score_cutoff=0):
+    """(merchant, score, key) of the best token_set_ratio match for text, or None; score rounded like fuzzywuzzy's"""
+    if fuzz is None or not merchants:
+        return None
+    match = process.extractOne(str(text), merchants, scorer=fuzz.token_set_ratio,
+                               processor=default_process, score_cutoff=score_cutoff)
+    if match is None:
+        return None
+    merchant, score, key = match
+    return merchant, int(round(score)), key
+
+
+# Logic sheet rules as parallel arrays: lowered merchant, category, subcategory
+LogicIndex = namedtuple('LogicIndex', ['merchants', 'cats', 'subs'])
+
+
+def prepare_logic_index(logic_sheet_df):
+    """Build the LogicIndex for a logic sheet once, before categorizing a batch"""
+    merchants = logic_merchants(logic_sheet_df)
+    rules = logic_sheet_df.loc[list(merchants)]
+    
+    def column(name, default):
+        if name in rules.columns:
+            return rules[name].map(str).to_numpy(dtype=object)
+        return np.full(len(rules), default, dtype=object)
+    
+    return LogicIndex(np.asarray(list(merchants.values()), dtype=object),
+                      column('Category', 'Misc'), column('Subcategory', 'Yet to Name'))
+
+
+def categorize_transactions(descriptions, amounts, logic_index):
+    """Categorize a batch of transactions: one fuzzy score matrix against the logic sheet, heuristics for the rest"""
+    descriptions = [str(d) for d in descriptions]
+    categories, subcategories = heuristic_categories(descriptions, amounts)
+    
+    if fuzz is not None and len(logic_index.merchants) and descriptions:
+        scores = process.cdist(descriptions, logic_index.merchants, scorer=fuzz.token_set_ratio,
+                               processor=default_process, score_cutoff=MATCH_CUTOFF, workers=-1)
+        best = scores.argmax(axis=1)
+        matched = np.rint(scores[np.arange(len(descriptions)), best]) >= MATCH_THRESHOLD
+        categories[matched] = logic_index.cats[best[matched]]
+        subcategories[matched] = logic_index.subs[best[matched]]
+    
+    return categories, subcategories
+
+
+def heuristic_categories(descriptions, amounts):
+    """Fallback (category, subcategory) arrays for transactions no logic sheet rule matches"""
+    desc_lower = pd.Series(descriptions, dtype=object).str.lower()
+    amounts = np.asarray(amounts, dtype=float)
+    
+    keyword = desc_lower.str.contains(TRANSPORT_RE).to_numpy()
+    transport = ((amounts >= 15) & (amounts <= 50)) | keyword
+    
+    categories = np.where(transport, 'Transport', 'Misc').astype(object)
+    subcategories = np.where(transport, 'Auto', 'Yet to Name').astype(object)
+    
+    # Subcategory keywords are all transport keywords, so only keyword rows are rescanned
+    pending = np.flatnonzero(keyword)
+    for name, pattern in TRANSPORT_SUBCATEGORY_RES:
+        matched = desc_lower.iloc[pending].str.contains(pattern).to_numpy()
+        subcategories[pending[matched]] = name
+        pending = pending[~matched]
+    return categories, subcategories
+
+
+def process_pdf_data(pdf_files, logic_sheet_df):
+    """Process multiple PDF files and categorize transactions"""
+    all_transactions = []
+    seen_ids = set()
+    
+    # PDF text extraction is CPU-bound, so parse statements in separate processes
+    if len(pdf_files) > 1:
+        dfs = [None] * len(pdf_files)
+        progress = st.progress(0.0, text="Parsing statements...")
+        with ProcessPoolExecutor(max_workers=min(os.cpu_count() or 1, len(pdf_files))) as ex:
+            futures = {ex.submit(_extract_one_pdf, pdf_path): i for i, pdf_path in enumerate(pdf_files)}
+            for done, future in enumerate(as_completed(futures), 1):
+                dfs[futures[future]] = future.result()
+                progress.progress(done / len(pdf_files), text=f"Parsed {done}/{len(pdf_files)} statements")
+        progress.empty()
+    else:
+        dfs = [_extract_one_pdf(pdf_path) for pdf_path in pdf_files]
+    
+    for pdf_path, df in zip(pdf_files, dfs):
+        if df is None:
+            st.warning(f"Could not process {Path(pdf_path).name}")
+        elif not df.empty:
+            # Drop IDs already taken from an earlier (overlapping) statement before concatenating
+            df = df.drop_duplicates(subset=['Transaction ID'], keep='first')
+            df = df[~df['Transaction ID'].isin(seen_ids)]
+            seen_ids.update(df['Transaction ID'])
+            all_transactions.append(df)
+    
+    if not all_transactions:
+        return pd.DataFrame()
+    
+    combined_df = pd.concat(all_transactions, ignore_index=True)
+    combined_df = combined_df.sort_values('Date', kind='mergesort', ignore_index=True)
+    
+    # Only sent payments are expenses; received rows are never categorized
+    expense_df = combined_df[combined_df['Type'] == 'Sent'].drop('Type', axis=1)
+    
+    categories, subcategories = categorize_transactions(
+        expense_df['Description'], expense_df['Amount'], prepare_logic_index(logic_sheet_df)
+    )
+    expense_df['Category'] = categories
+    expense_df['Sub Category'] = subcategories
+    
+    return expense_df
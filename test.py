@@ -11,6 +11,7 @@ import re
 import requests
 import json
 import os
+from functools import lru_cache
 import pdfplumber
 from datetime import datetime
 
@@ -54,17 +55,34 @@ def update_brain(merchant: str, category: str, sub_category: str):
     }
     save_brain(brain)
 
-def lookup_brain(merchant: str):
+@lru_cache(maxsize=8)
+def _brain_matcher(keys: tuple):
+    """Compile the brain keys (in brain order) into one overlapping-match regex plus a joined lookup string."""
+    pattern = re.compile("(?=(" + "|".join(map(re.escape, keys)) + "))")
+    order = {k: i for i, k in enumerate(keys)}
+    return pattern, order, "\x00".join(keys)
+
+def lookup_brain(merchant: str, brain: dict = None):
     """Look up a merchant in the brain. Returns (category, sub_category) or (None, None)."""
-    brain = load_brain()
+    if brain is None:
+        brain = load_brain()
     key = merchant.strip().lower()
     # Exact match first
     if key in brain:
         return brain[key]["category"], brain[key]["sub_category"]
-    # Fuzzy: check if brain key is contained in the merchant string
-    for bkey, bval in brain.items():
-        if bkey in key or key in bkey:
-            return bval["category"], bval["sub_category"]
+    if not brain:
+        return None, None
+    # Fuzzy: earliest brain key that is contained in the merchant string or contains it.
+    # One regex pass finds every brain key inside the merchant; one find() the reverse.
+    keys = tuple(brain)
+    pattern, order, joined = _brain_matcher(keys)
+    hits = [order[m.group(1)] for m in pattern.finditer(key)]
+    pos = joined.find(key)
+    if pos != -1:
+        hits.append(joined.count("\x00", 0, pos))
+    if hits:
+        bval = brain[keys[min(hits)]]
+        return bval["category"], bval["sub_category"]
     return None, None
 
 def apply_brain_to_df(df: pd.DataFrame):
@@ -73,36 +91,58 @@ def apply_brain_to_df(df: pd.DataFrame):
     if not brain:
         return df, 0
     
-    filled = 0
-    for idx, row in df.iterrows():
-        if pd.isna(row.get("Category")) or row.get("Category") in ["Uncategorized", "", None]:
-            merchant = str(row.get("Description", "")).strip()
-            cat, subcat = lookup_brain(merchant)
-            if cat:
-                df.at[idx, "Category"] = cat
-                df.at[idx, "Sub Category"] = subcat or "General"
-                filled += 1
+    if "Category" in df.columns:
+        todo = df["Category"].isna() | df["Category"].isin(["Uncategorized", ""])
+    else:
+        todo = pd.Series(True, index=df.index)
+    if not todo.any():
+        return df, 0
+    if "Description" in df.columns:
+        merchants = df.loc[todo, "Description"].map(str).str.strip()
+    else:
+        merchants = pd.Series("", index=df.index[todo], dtype=object)
+    
+    # Each distinct merchant is looked up once, then mapped back onto its rows
+    known = {}
+    for merchant in merchants.unique():
+        cat, subcat = lookup_brain(merchant, brain)
+        if cat:
+            known[merchant] = (cat, subcat or "General")
+    
+    hits = merchants[merchants.isin(list(known))]
+    if not hits.empty:
+        df.loc[hits.index, "Category"] = hits.map({m: v[0] for m, v in known.items()})
+        df.loc[hits.index, "Sub Category"] = hits.map({m: v[1] for m, v in known.items()})
+    filled = len(hits)
     return df, filled
 
 # =========================================================
 # PDF PARSING — Google Pay & Credit Card Statements
 # =========================================================
-
-def parse_google_pay_pdf(uploaded_file) -> pd.DataFrame:
-    import pdfplumber
-    import pandas as pd
-    import re
-
-    rows = []
+# Patterns compiled once, not looked up in re's cache per line
+DIGIT_ALPHA_RE = re.compile(r'(?<=\d)(?=[A-Za-z])')
+LOWER_UPPER_RE = re.compile(r'(?<=[a-z])(?=[A-Z])')
+PDF_DATE_RE = re.compile(r'\d{1,2}\s?[A-Za-z]{3},\s?\d{4}')
+PDF_AMOUNT_RE = re.compile(r'₹\s*([\d,]+\.?\d*)')
+PAIDTO_RE = re.compile("paidto", re.IGNORECASE)
+NON_ALPHA_RE = re.compile(r'[^A-Za-z ]')
+WS_RE = re.compile(r'\s+')
+TIME_RE = re.compile(r'(\d{1,2}):(\d{2})(?::\d{2})?\s*(AM|PM)?')
+
+# Keyed on the file's bytes, so reruns (edits, downloads) reuse the parsed frame
+@st.cache_data(show_spinner=False)
+def parse_google_pay_pdf(pdf_bytes: bytes) -> pd.DataFrame:
+    # one list per column; the frame is built once at the end
+    dates, descriptions, amounts = [], [], []
 
     try:
-        with pdfplumber.open(uploaded_file) as pdf:
+        with pdfplumber.open(BytesIO(pdf_bytes)) as pdf:
             for page in pdf.pages:
                 text = page.extract_text() or ""
 
                 # 🔥 CLEAN TEXT (CRITICAL)
-                text = re.sub(r'(?<=\d)(?=[A-Za-z])', ' ', text)
-                text = re.sub(r'(?<=[a-z])(?=[A-Z])', ' ', text)
+                text = DIGIT_ALPHA_RE.sub(' ', text)
+                text = LOWER_UPPER_RE.sub(' ', text)
 
                 lines = text.split("\n")
 
@@ -113,11 +153,17 @@ def parse_google_pay_pdf(uploaded_file) -> pd.DataFrame:
                     if "₹" not in line:
                         continue
 
+                    # ✅ Only "paid to" lines become rows (skip credit / self transfer)
+                    #    — cheap substring checks before any regex runs
+                    line_lower = line.lower()
+                    if "receivedfrom" in line_lower or "paidto" not in line_lower:
+                        continue
+
                     try:
                         # -----------------------------
                         # STEP 1: EXTRACT DATE
                         # -----------------------------
-                        date_match = re.search(r'\d{1,2}\s?[A-Za-z]{3},\s?\d{4}', line)
+                        date_match = PDF_DATE_RE.search(line)
                         if not date_match:
                             continue
 
@@ -126,58 +172,32 @@ def parse_google_pay_pdf(uploaded_file) -> pd.DataFrame:
                         # -----------------------------
                         # STEP 2: EXTRACT AMOUNT
                         # -----------------------------
-                        amt_match = re.search(r'₹\s*([\d,]+\.?\d*)', line)
+                        amt_match = PDF_AMOUNT_RE.search(line)
                         if not amt_match:
                             continue
 
-                        amount = float(amt_match.group(1).replace(",", ""))
+                        amount_str = amt_match.group(1)
 
                         # -----------------------------
-                        # STEP 3: IDENTIFY TYPE
+                        # STEP 3: EXTRACT MERCHANT
                         # -----------------------------
-                        line_lower = line.lower()
-
-                        if "receivedfrom" in line_lower:
-                            continue  # skip credit
-
-                        # -----------------------------
-                        # STEP 4: EXTRACT MERCHANT
-                        # -----------------------------
-                        merchant = ""
-
-                        if "paidto" in line_lower:
-                            merchant = re.split("paidto", line, flags=re.IGNORECASE)[1]
-                        elif "selftransferto" in line_lower:
-                            continue  # skip self transfer
-                        else:
-                            continue
+                        merchant = PAIDTO_RE.split(line)[1]
 
                         # remove amount from merchant
                         merchant = merchant.split("₹")[0]
 
                         # clean merchant
-                        merchant = re.sub(r'[^A-Za-z ]', '', merchant)
+                        merchant = NON_ALPHA_RE.sub('', merchant)
                         merchant = merchant.lower().strip()
-                        merchant = re.sub(r'\s+', ' ', merchant)
+                        merchant = WS_RE.sub(' ', merchant)
 
                         if not merchant:
                             continue
 
-                        # -----------------------------
-                        # STEP 5: DATE PARSE
-                        # -----------------------------
-                        date = pd.to_datetime(date_str, errors="coerce")
-                        if pd.isna(date):
-                            continue
-
-                        rows.append({
-                            "Date": date,
-                            "Description": merchant.title(),
-                            "Amount": amount,
-                            "Category": "Uncategorized",
-                            "Sub Category": "Uncategorized",
-                            "Source": "PDF"
-                        })
+                        # date and amount text are parsed for the whole batch below
+                        dates.append(" ".join(date_str.replace(",", " ").split()))
+                        descriptions.append(merchant.title())
+                        amounts.append(amount_str)
 
                     except:
                         continue
@@ -185,8 +205,22 @@ def parse_google_pay_pdf(uploaded_file) -> pd.DataFrame:
     except Exception as e:
         st.error(f"PDF parsing error: {e}")
 
-    if rows:
-        df = pd.DataFrame(rows)
+    if dates:
+        df = pd.DataFrame({
+            "Date": dates,
+            "Description": descriptions,
+            "Amount": amounts,
+            "Category": "Uncategorized",
+            "Sub Category": "Uncategorized",
+            "Source": "PDF"
+        })
+
+        # -----------------------------
+        # STEP 4: DATE + AMOUNT PARSE (one vectorized pass each, bad rows dropped together)
+        # -----------------------------
+        df["Date"] = pd.to_datetime(df["Date"], format="%d %b %Y", errors="coerce")
+        df["Amount"] = pd.to_numeric(df["Amount"].str.replace(",", "", regex=False), errors="coerce")
+        df = df.dropna(subset=["Date", "Amount"])
 
         # ✅ REMOVE DUPLICATES
         df = df.drop_duplicates(subset=["Date", "Description", "Amount"])
@@ -197,15 +231,11 @@ def parse_google_pay_pdf(uploaded_file) -> pd.DataFrame:
 
 def extract_pdf_raw_text(uploaded_file) -> str:
     """Extract all raw text from a PDF for debugging."""
-    text = ""
     try:
         with pdfplumber.open(uploaded_file) as pdf:
-            for page in pdf.pages:
-                text += page.extract_text() or ""
-                text += "\n--- PAGE BREAK ---\n"
+            return "".join((page.extract_text() or "") + "\n--- PAGE BREAK ---\n" for page in pdf.pages)
     except Exception as e:
-        text = f"Error: {e}"
-    return text
+        return f"Error: {e}"
 
 
 # =========================================================
@@ -566,7 +596,7 @@ def parse_time_to_hour(time_val):
     if pd.isna(time_val):
         return 12
     time_str = str(time_val).strip().upper()
-    match = re.match(r'(\d{1,2}):(\d{2})(?::\d{2})?\s*(AM|PM)?', time_str)
+    match = TIME_RE.match(time_str)
     if match:
         hour = int(match.group(1))
         am_pm = match.group(3)
@@ -693,19 +723,18 @@ if mode == "📄 PDF Upload":
             new_pdf_dfs = []
             for pdf_file in pdf_files:
                 with st.spinner(f"Reading {pdf_file.name}..."):
-                    parsed_df = parse_google_pay_pdf(pdf_file)
+                    parsed_df = parse_google_pay_pdf(pdf_file.getvalue())
                     if not parsed_df.empty:
-                        # Apply brain memory immediately
+                        # Apply brain memory immediately (not cached: the brain changes as you categorize)
                         parsed_df, filled = apply_brain_to_df(parsed_df)
                         new_pdf_dfs.append(parsed_df)
                         st.success(f"✅ {pdf_file.name}: {len(parsed_df)} transactions ({filled} auto-categorized)")
                     else:
                         st.warning(f"⚠️ {pdf_file.name}: No transactions found. Try the raw text view below.")
-                        # Show raw text for debugging
-                        pdf_file.seek(0)
-                        raw = extract_pdf_raw_text(pdf_file)
-                        with st.expander("📝 Raw PDF Text (for debugging)"):
-                            st.text(raw[:3000])
+                        # Raw text for debugging — only re-read the PDF when asked
+                        if st.checkbox("📝 Raw PDF Text (for debugging)", key=f"raw_{pdf_file.name}"):
+                            pdf_file.seek(0)
+                            st.text(extract_pdf_raw_text(pdf_file)[:3000])
             
             if new_pdf_dfs:
                 st.session_state['pdf_dfs'] = new_pdf_dfs
@@ -1270,7 +1299,7 @@ with tab5:
 with tab6:
     st.markdown("### 📤 Export")
     buf = BytesIO()
-    df.sort_values(date_col).to_excel(buf, index=False)
+    df.sort_values(date_col).to_excel(buf, index=False, engine="xlsxwriter")
     st.download_button("📥 Download Excel (with brain-categorized data)", buf.getvalue(), "expense_data.xlsx")
 
 # =========================================================
@@ -12,6 +12,24 @@ import pdfplumber
 st.set_page_config(layout="wide")
 st.title("📄 GPay PDF Extractor (SMART VERSION)")
 
+# ==========================================
+# REGEX PATTERNS (compiled once)
+# ==========================================
+DIGIT_ALPHA_RE = re.compile(r'(?<=\d)(?=[A-Za-z])')
+LOWER_UPPER_RE = re.compile(r'(?<=[a-z])(?=[A-Z])')
+DATE_RE = re.compile(r'\d{1,2}\s[A-Za-z]{3},\d{4}')
+AMOUNT_RE = re.compile(r'₹\s*([\d,]+\.?\d*)')
+PAID_SPLIT_RE = re.compile(r'Paidto|Paid to')
+RECEIVED_SPLIT_RE = re.compile(r'Receivedfrom|Received from')
+NON_ALPHA_RE = re.compile(r'[^A-Za-z ]')
+TIME_RE = re.compile(r'\d{1,2}:\d{2}\s?[AP]M')
+UPI_ID_RE = re.compile(r'UPI\s*Transaction\s*ID:\s*(\d+)')
+# A line holding both "₹" and a date (first date captured), plus the line after it
+TXN_LINES_RE = re.compile(r'^(?=[^\n]*₹)(?=[^\n]*?(' + DATE_RE.pattern + r'))([^\n]*)\n([^\n]*)', re.MULTILINE)
+
+RECORD_COLUMNS = ["Date", "Time", "Description", "Type", "Amount", "UPI_ID"]
+TXN_TYPE_DTYPE = pd.CategoricalDtype(["Debit", "Credit", "Self Transfer", "Other"])
+
 # ==========================================
 # PARSER
 # ==========================================
@@ -26,89 +44,78 @@ def parse_pdf(file):
         for page in pdf.pages:
             text = page.extract_text() or ""
 
-            text = re.sub(r'(?<=\d)(?=[A-Za-z])', ' ', text)
-            text = re.sub(r'(?<=[a-z])(?=[A-Z])', ' ', text)
+            text = DIGIT_ALPHA_RE.sub(' ', text)
+            text = LOWER_UPPER_RE.sub(' ', text)
 
             page_lines = [l.strip() for l in text.split("\n") if l.strip()]
             lines.extend(page_lines)
 
-    i = 0
-
-    while i < len(lines) - 1:
-
-        line1 = lines[i]
-        line2 = lines[i + 1]
-
-        if "₹" in line1:
-
-            try:
-                # DATE
-                date_match = re.search(r'\d{1,2}\s[A-Za-z]{3},\d{4}', line1)
-                if not date_match:
-                    i += 1
-                    continue
-
-                date = pd.to_datetime(date_match.group(), format="%d %b,%Y", errors="coerce")
-
-                # AMOUNT
-                amt_match = re.search(r'₹\s*([\d,]+\.?\d*)', line1)
-                amount = float(amt_match.group(1).replace(",", "")) if amt_match else None
-
-                # TYPE LOGIC
-                if "Selftransfer" in line1 or "Self transfer" in line1:
-                    txn_type = "Self Transfer"
-                    desc = "Self Transfer"
-
-                elif "Paidto" in line1 or "Paid to" in line1:
-                    txn_type = "Debit"
-                    desc = re.split(r'Paidto|Paid to', line1)[1]
-
-                elif "Receivedfrom" in line1 or "Received from" in line1:
-                    txn_type = "Credit"
-                    desc = re.split(r'Receivedfrom|Received from', line1)[1]
-
-                else:
-                    txn_type = "Other"
-                    desc = ""
-
-                desc = desc.split("₹")[0]
-                desc = re.sub(r'[^A-Za-z ]', '', desc).strip()
-
-                # TIME
-                time_match = re.search(r'\d{1,2}:\d{2}\s?[AP]M', line2)
-                time = time_match.group() if time_match else ""
-
-                # UPI
-                upi_match = re.search(r'UPI\s*Transaction\s*ID:\s*(\d+)', line2)
-                upi_id = upi_match.group(1) if upi_match else ""
-
-                # SIGN LOGIC
-                if txn_type == "Debit":
-                    final_amount = amount
-                elif txn_type == "Credit":
-                    final_amount = -amount
-                else:
-                    final_amount = amount
-
-                if amount is not None:
-                    records.append({
-                        "Date": date,
-                        "Time": time,
-                        "Description": desc,
-                        "Type": txn_type,
-                        "Amount": final_amount,
-                        "UPI_ID": upi_id
-                    })
-
-                i += 2
-                continue
-
-            except:
-                pass
-
-        i += 1
-
-    df = pd.DataFrame(records)
+    # One compiled scan jumps straight to each "₹ + date" line and the line after it
+    text = "\n".join(lines)
+    pos = 0
+
+    while True:
+        m = TXN_LINES_RE.search(text, pos)
+        if m is None:
+            break
+
+        date, line1, line2 = m.groups()
+        # both lines are consumed unless the pair turns out unparseable
+        pos = m.end()
+
+        try:
+            # AMOUNT
+            amt_match = AMOUNT_RE.search(line1)
+            amount = float(amt_match.group(1).replace(",", "")) if amt_match else None
+
+            # TYPE LOGIC
+            if "Selftransfer" in line1 or "Self transfer" in line1:
+                txn_type = "Self Transfer"
+                desc = "Self Transfer"
+
+            elif "Paidto" in line1 or "Paid to" in line1:
+                txn_type = "Debit"
+                desc = PAID_SPLIT_RE.split(line1)[1]
+
+            elif "Receivedfrom" in line1 or "Received from" in line1:
+                txn_type = "Credit"
+                desc = RECEIVED_SPLIT_RE.split(line1)[1]
+
+            else:
+                txn_type = "Other"
+                desc = ""
+
+            desc = desc.split("₹")[0]
+            desc = NON_ALPHA_RE.sub('', desc).strip()
+
+            # TIME
+            time_match = TIME_RE.search(line2)
+            time = time_match.group() if time_match else ""
+
+            # UPI
+            upi_match = UPI_ID_RE.search(line2)
+            upi_id = upi_match.group(1) if upi_match else ""
+
+            # SIGN LOGIC
+            if txn_type == "Debit":
+                final_amount = amount
+            elif txn_type == "Credit":
+                final_amount = -amount
+            else:
+                final_amount = amount
+
+            if amount is not None:
+                records.append((date, time, desc, txn_type, final_amount, upi_id))
+
+        except:
+            # retry from the second line, which may start a transaction itself
+            pos = m.start(3)
+
+    # one frame from plain tuples; dates parsed and Type encoded column-wise
+    df = pd.DataFrame.from_records(records, columns=RECORD_COLUMNS)
+    df["Date"] = pd.to_datetime(df["Date"], format="%d %b,%Y", errors="coerce")
+    df["Amount"] = df["Amount"].astype(float)
+    df["Type"] = df["Type"].astype(TXN_TYPE_DTYPE)
 
     # REMOVE DUPLICATES (IMPORTANT)
     df = df.drop_duplicates(subset=["UPI_ID"])
@@ -134,9 +141,11 @@ if uploaded_file:
         # =========================
         # SPLIT DATA
         # =========================
-        debit_df = df[df["Type"] == "Debit"]
-        credit_df = df[df["Type"] == "Credit"]
-        self_df = df[df["Type"] == "Self Transfer"]
+        # one partitioning pass instead of a boolean mask per type
+        by_type = dict(tuple(df.groupby("Type", sort=False, observed=True)))
+        debit_df = by_type.get("Debit", df.iloc[:0])
+        credit_df = by_type.get("Credit", df.iloc[:0])
+        self_df = by_type.get("Self Transfer", df.iloc[:0])
 
         # =========================
         # SUMMARY